@@ -0,0 +1,186 @@
+import multiprocessing
+import os
+import queue
+import threading
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+from numpy_model import NumpyModel
+from rules import masked_argmax, masked_sample
+from utils import spawn_seeds
+from vec_environment import VecUnoEnvironment
+
+
+class SharedArrays:
+    """
+        Named NumPy arrays laid out back to back in one shared memory block.
+        Pickling only sends the layout and block name, so the arrays can be
+        handed to other processes which attach to the same memory.
+    """
+    def __init__(self, specs, name=None):
+        self.specs = specs
+        offsets = []
+        size = 0
+        for key, shape, dtype in specs:
+            offsets.append(size)
+            size += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 8) * 8
+        self.memory = SharedMemory(name=name, create=name is None, size=max(size, 1))
+        self.arrays = {key: np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset)
+                       for (key, shape, dtype), offset in zip(specs, offsets)}
+
+    def __reduce__(self):
+        return SharedArrays, (self.specs, self.memory.name)
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def close(self, unlink=False):
+        self.arrays = {}
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+def transition_specs(slots, number_of_games, state_size):
+    return [('states', (slots, number_of_games, state_size), np.uint8),
+            ('actions', (slots, number_of_games), np.int16),
+            ('rewards', (slots, number_of_games), np.float32),
+            ('next_states', (slots, number_of_games, state_size), np.uint8),
+            ('dones', (slots, number_of_games), bool)]
+
+
+def run_actor(actor, config, seed, transitions, free_slots, filled_slots, weights, weights_version, shared_epsilon,
+              weights_lock, stop):
+    env_seed, rng_seed = spawn_seeds(seed, 2)
+    env = VecUnoEnvironment(config['number_of_games'], seed=env_seed)
+    rng = np.random.default_rng(rng_seed)
+    epsilon = shared_epsilon.value
+    model = None
+    version = 0
+    states, legal_masks = env.reset()
+
+    while not stop.is_set():
+        if weights_version.value != version:
+            with weights_lock:
+                version = weights_version.value
+                current_weights = [weights[str(index)].copy() for index in range(len(weights.specs))]
+                epsilon = shared_epsilon.value
+            if model is None:
+                model = NumpyModel(current_weights)
+            else:
+                model.set_weights(current_weights)
+
+        actions = masked_sample(legal_masks, rng)
+        if model is not None:
+            greedy = rng.random(len(actions)) >= epsilon
+            if greedy.any():
+                values = model.predict(states[greedy], batch_size=int(np.count_nonzero(greedy)))
+                actions[greedy] = masked_argmax(values, legal_masks[greedy])
+
+        new_states, rewards, dones, legal_masks = env.step(actions)
+
+        # Waits for the learner to hand back a slot, so actors can not run away from it
+        slot = None
+        while slot is None and not stop.is_set():
+            try:
+                slot = free_slots.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        if slot is None:
+            break
+        transitions['states'][slot] = states
+        transitions['actions'][slot] = actions
+        transitions['rewards'][slot] = rewards
+        transitions['next_states'][slot] = new_states
+        transitions['dones'][slot] = dones
+        filled_slots.put((actor, slot))
+        states = new_states
+
+    transitions.close()
+    weights.close()
+
+
+class ActorPool:
+    """
+        Runs self-play actors in separate processes. Each actor steps a
+        VecUnoEnvironment and writes its transitions into shared memory slots,
+        the learner copies filled slots into agent's replay memory and hands them
+        back. Weights published with publish_weights are picked up by every
+        actor before its next step, together with the epsilon of the agent,
+        which decays with the transitions collected from all actors. Every actor gets its own seed spawned
+        from seed, an int or SeedSequence.
+    """
+    def __init__(self, agent, number_of_actors=None, number_of_games=64, slots=4, seed=0):
+        self.agent = agent
+        self.number_of_actors = number_of_actors or max(1, (os.cpu_count() or 2) - 1)
+        self.context = multiprocessing.get_context('spawn')
+        self.seeds = spawn_seeds(seed, self.number_of_actors)
+        self.config = {'number_of_games': number_of_games}
+
+        self.transitions = [SharedArrays(transition_specs(slots, number_of_games, agent.state_size))
+                            for _ in range(self.number_of_actors)]
+        self.free_slots = [self.context.Queue() for _ in range(self.number_of_actors)]
+        for free_slots in self.free_slots:
+            for slot in range(slots):
+                free_slots.put(slot)
+        self.filled_slots = self.context.Queue()
+
+        self.weights = SharedArrays([(str(index), weight.shape, np.float32)
+                                     for index, weight in enumerate(agent.model.get_weights())])
+        self.weights_version = self.context.Value('q', 0, lock=False)
+        self.epsilon = self.context.Value('d', agent.epsilon, lock=False)
+        self.weights_lock = self.context.Lock()
+        self.stop_event = self.context.Event()
+        self.processes = []
+        self.collector = None
+        self.transitions_received = 0
+
+    def start(self):
+        # Restored weights and epsilon are played from the first step
+        self.publish_weights(self.agent.model.get_weights())
+        for actor in range(self.number_of_actors):
+            process = self.context.Process(target=run_actor, daemon=True,
+                                           args=(actor, self.config, self.seeds[actor], self.transitions[actor],
+                                                 self.free_slots[actor], self.filled_slots, self.weights,
+                                                 self.weights_version, self.epsilon, self.weights_lock,
+                                                 self.stop_event))
+            process.start()
+            self.processes.append(process)
+        self.collector = threading.Thread(target=self.collect, daemon=True)
+        self.collector.start()
+
+    def collect(self):
+        while not self.stop_event.is_set():
+            try:
+                actor, slot = self.filled_slots.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            transitions = self.transitions[actor]
+            self.agent.add_transitions_to_memory(transitions['states'][slot], transitions['actions'][slot],
+                                                 transitions['rewards'][slot], transitions['next_states'][slot],
+                                                 transitions['dones'][slot])
+            count = len(transitions['actions'][slot])
+            self.transitions_received += count
+            self.free_slots[actor].put(slot)
+            # Decayed as in run_vectorized, actors pick it up with the next weights
+            agent = self.agent
+            if agent.initialized and agent.epsilon > agent.epsilon_min:
+                agent.epsilon *= agent.epsilon_decay ** count
+
+    def publish_weights(self, weights):
+        with self.weights_lock:
+            for index, weight in enumerate(weights):
+                self.weights[str(index)][...] = weight
+            self.epsilon.value = self.agent.epsilon
+            self.weights_version.value += 1
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if self.collector is not None:
+            self.collector.join()
+        for transitions in self.transitions:
+            transitions.close(unlink=True)
+        self.weights.close(unlink=True)
@@ -0,0 +1,154 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import time
+import numpy as np
+from checkpoint import checkpoint_paths, load_checkpoint
+from evaluate import Evaluator
+from numpy_model import NumpyModel
+
+# Set for the evaluator process only, a forward pass can not spread over all cores
+BLAS_THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def next_weights(config, weights, last_checkpoint):
+    # Latest published weights, else the newest checkpoint not evaluated yet
+    try:
+        return weights.get(timeout=config['poll_interval'])
+    except queue.Empty:
+        pass
+    if config['checkpoints'] is None or not os.path.isdir(config['checkpoints']):
+        return None
+    paths = checkpoint_paths(config['checkpoints'])
+    if not paths or paths[-1] == last_checkpoint:
+        return None
+    snapshot = load_checkpoint(paths[-1], replay=False)
+    return 'checkpoint', snapshot['iteration'], snapshot['model'], paths[-1]
+
+
+def run_evaluator(config, weights, stop):
+    # Runs behind the learner and actors, the budget below limits how much CPU it takes on average
+    if hasattr(os, 'nice'):
+        os.nice(config['niceness'])
+    last_checkpoint = None
+    # process_time counts from the start of the process, its imports are charged to the first evaluation
+    budget_cpu_start = 0.0
+    budget_start = time.perf_counter()
+    while not stop.is_set():
+        job = next_weights(config, weights, last_checkpoint)
+        if job is None:
+            continue
+        source, iteration, model_weights, checkpoint = job
+        if checkpoint is not None:
+            last_checkpoint = checkpoint
+
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        # Same seed every time, all weights play the same deals
+        results = Evaluator(NumpyModel(model_weights), config['number_of_games'],
+                            config['seed']).evaluate(config['games'])
+        cpu_seconds = time.process_time() - cpu_start
+        seconds = time.perf_counter() - start
+
+        line = {'time': time.time(), 'source': source, 'iteration': iteration, 'games': results['games'],
+                'win_rate': results['win_rate'], 'mean_game_length': results['mean_game_length'],
+                'seconds': seconds, 'cpu_seconds': cpu_seconds}
+        if checkpoint is not None:
+            line['checkpoint'] = checkpoint
+        with open(config['path'], 'a') as file:
+            file.write(json.dumps(line) + '\n')
+
+        # Idles until no more than cpu_budget cores were used since the last evaluation, polling included
+        budget_cpu_seconds = time.process_time() - budget_cpu_start
+        stop.wait(max(0.0, budget_cpu_seconds / config['cpu_budget'] - (time.perf_counter() - budget_start)))
+        budget_cpu_start = time.process_time()
+        budget_start = time.perf_counter()
+
+
+class BackgroundEvaluator:
+    """
+        Plays the model against the random agent of UnoTest in a separate
+        process while training goes on, and appends the win rate and mean
+        game length of every evaluation to path as a JSON line. It evaluates
+        the weights handed to publish_weights, a weight sync callback, and
+        the newest checkpoint in checkpoints when given. Only the latest
+        weights wait for an evaluation, older ones are dropped. The process
+        runs at a lower priority and idles after every evaluation, so it
+        uses at most cpu_budget CPU cores on average.
+    """
+    def __init__(self, path, agent=None, games=1000, number_of_games=256, seed=0, cpu_budget=0.5,
+                 checkpoints=None, poll_interval=1.0, niceness=10):
+        self.agent = agent
+        self.context = multiprocessing.get_context('spawn')
+        self.config = {'path': path, 'games': games, 'number_of_games': number_of_games, 'seed': seed,
+                       'cpu_budget': cpu_budget, 'checkpoints': checkpoints, 'poll_interval': poll_interval,
+                       'niceness': niceness}
+        self.weights = self.context.Queue(maxsize=1)
+        self.stop_event = self.context.Event()
+        self.process = None
+        self.dropped = 0
+
+    def start(self):
+        self.process = self.context.Process(target=run_evaluator, daemon=True,
+                                            args=(self.config, self.weights, self.stop_event))
+        # The spawned process reads its environment when NumPy loads, this process keeps its own settings
+        saved = {name: os.environ.get(name) for name in BLAS_THREAD_VARIABLES}
+        os.environ.update({name: '1' for name in BLAS_THREAD_VARIABLES})
+        try:
+            self.process.start()
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    del os.environ[name]
+                else:
+                    os.environ[name] = value
+        return self
+
+    def publish_weights(self, weights):
+        iteration = self.agent.iteration if self.agent is not None else None
+        try:
+            self.weights.get_nowait()
+            self.dropped += 1
+        except queue.Empty:
+            pass
+        try:
+            self.weights.put_nowait(('sync', iteration, [np.asarray(weight) for weight in weights], None))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self, timeout=5):
+        # An evaluation still running after timeout is abandoned
+        self.stop_event.set()
+        if self.process is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        # Weights the process never read would keep the feeder thread of the queue, and with it this
+        # process, from exiting
+        try:
+            while True:
+                self.weights.get_nowait()
+        except queue.Empty:
+            pass
+        self.weights.close()
+        self.weights.cancel_join_thread()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('checkpoints', help='checkpoint directory of a training run to follow')
+    parser.add_argument('metrics', help='append a JSON line per evaluated checkpoint to this file')
+    parser.add_argument('--games', type=int, default=1000, help='games played against the random agent')
+    parser.add_argument('--cpu-budget', type=float, default=0.5, help='CPU cores used on average')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    evaluator = BackgroundEvaluator(args.metrics, games=args.games, seed=args.seed, cpu_budget=args.cpu_budget,
+                                    checkpoints=args.checkpoints).start()
+    try:
+        evaluator.process.join()
+    except KeyboardInterrupt:
+        evaluator.stop()
@@ -0,0 +1,241 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import numpy as np
+from deck import Deck
+from environment import UnoEnvironment
+from evaluate import Evaluator
+from game_record import GameRecorder
+from numpy_model import NumpyModel
+from replay import PrioritizedReplayMemory, ReplayMemory
+from rules import masked_sample
+from vec_environment import VecUnoEnvironment
+
+SEED = 0
+
+
+def seed_everything():
+    random.seed(SEED)
+    np.random.seed(SEED)
+
+
+def best_time(function, number, rounds=5):
+    # Best of rounds, each timing number calls of function
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def random_model(seed=SEED):
+    rng = np.random.default_rng(seed)
+    sizes = [UnoEnvironment.STATE_SIZE, 64, 64, 64, UnoEnvironment.ACTION_COUNT]
+    weights = []
+    for inputs, outputs in zip(sizes[:-1], sizes[1:]):
+        weights += [rng.normal(0, 0.1, (inputs, outputs)), np.zeros(outputs)]
+    return NumpyModel(weights)
+
+
+def benchmark_env_step():
+    env = UnoEnvironment(2, seed=SEED)
+    rng = np.random.default_rng(SEED)
+    steps = 20000
+    start = time.perf_counter()
+    for _ in range(steps):
+        _, _, done, _ = env.step(masked_sample(env.get_legal_mask(), rng))
+        if done:
+            env.reset()
+    return steps / (time.perf_counter() - start), 'steps/s', True
+
+
+def benchmark_env_reset():
+    env = UnoEnvironment(2, seed=SEED)
+    return 1 / best_time(env.reset, 1000), 'resets/s', True
+
+
+def benchmark_vec_env_step(recorder=None):
+    env = VecUnoEnvironment(1024, seed=SEED, recorder=recorder)
+    _, legal_masks = env.reset()
+    rng = np.random.default_rng(SEED)
+    steps = 100
+    start = time.perf_counter()
+    for _ in range(steps):
+        _, _, _, legal_masks = env.step(masked_sample(legal_masks, rng))
+    return steps * env.number_of_games / (time.perf_counter() - start), 'steps/s', True
+
+
+def benchmark_recorded_vec_env_step():
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = GameRecorder(directory)
+        result = benchmark_vec_env_step(recorder)
+        recorder.close()
+    return result
+
+
+def playing_environment():
+    env = UnoEnvironment(2, seed=SEED)
+    rng = np.random.default_rng(SEED)
+    for _ in range(20):
+        env.step(masked_sample(env.get_legal_mask(), rng))
+    return env
+
+
+def benchmark_get_state():
+    return best_time(playing_environment().get_state, 10000) * 1e6, 'us', False
+
+
+def benchmark_get_legal_actions():
+    return best_time(playing_environment().get_legal_actions, 10000) * 1e6, 'us', False
+
+
+def benchmark_get_legal_mask():
+    return best_time(playing_environment().get_legal_mask, 10000) * 1e6, 'us', False
+
+
+def benchmark_env_snapshot():
+    env = playing_environment()
+    return best_time(lambda: env.restore(env.snapshot()), 10000) * 1e6, 'us', False
+
+
+def benchmark_env_clone():
+    return best_time(playing_environment().clone, 2000) * 1e6, 'us', False
+
+
+def benchmark_deck():
+    rng = np.random.default_rng(SEED)
+    return 1 / best_time(lambda: Deck(rng), 2000), 'decks/s', True
+
+
+def filled_replay_memory(capacity=10000, memory_class=ReplayMemory, packed=False):
+    memory = memory_class(capacity, UnoEnvironment.STATE_SIZE, seed=SEED, packed=packed)
+    rng = np.random.default_rng(SEED)
+    states = rng.integers(0, 2, (capacity, UnoEnvironment.STATE_SIZE), dtype=np.uint8)
+    memory.add_batch(states, rng.integers(0, UnoEnvironment.ACTION_COUNT, capacity),
+                     rng.normal(size=capacity), states, rng.random(capacity) < 0.05)
+    return memory
+
+
+def benchmark_replay_sample():
+    memory = filled_replay_memory()
+    return best_time(lambda: memory.sample(512), 200) * 1e6, 'us', False
+
+
+def benchmark_packed_replay_sample():
+    memory = filled_replay_memory(packed=True)
+    return best_time(lambda: memory.sample(512), 200) * 1e6, 'us', False
+
+
+def benchmark_prioritized_replay_sample():
+    memory = filled_replay_memory(memory_class=PrioritizedReplayMemory)
+    rng = np.random.default_rng(SEED)
+
+    def sample_and_update():
+        *_, indices, _ = memory.sample(512)
+        memory.update_priorities(indices, rng.normal(size=512))
+    return best_time(sample_and_update, 200) * 1e6, 'us', False
+
+
+def benchmark_train_iteration():
+    # Keras is optional here, the benchmark is skipped without it
+    from mydqnagent import DQNAgent
+    agent = DQNAgent(UnoEnvironment.STATE_SIZE, UnoEnvironment.ACTION_COUNT)
+    agent.replay_memory = filled_replay_memory()
+    # train_step waits for the rate limiter to count a batch of inserts
+    agent.rate_limiter.inserted(len(agent.replay_memory))
+    agent.train_step()
+    return best_time(agent.train_step, 20, rounds=3) * 1e3, 'ms', False
+
+
+def benchmark_fused_train_iteration():
+    # Needs TensorFlow, skipped without it
+    from mydqnagent import DQNAgent
+    agent = DQNAgent(UnoEnvironment.STATE_SIZE, UnoEnvironment.ACTION_COUNT)
+    agent.compile_train_step()
+    agent.replay_memory = filled_replay_memory()
+    # train_step waits for the rate limiter to count a batch of inserts
+    agent.rate_limiter.inserted(len(agent.replay_memory))
+    agent.train_step()
+    return best_time(agent.train_step, 20, rounds=3) * 1e3, 'ms', False
+
+
+def benchmark_runtest():
+    results = Evaluator(random_model(), seed=SEED).evaluate(2000)
+    return results['games_per_second'], 'games/s', True
+
+
+BENCHMARKS = {
+    'env_step': benchmark_env_step,
+    'env_reset': benchmark_env_reset,
+    'vec_env_step': benchmark_vec_env_step,
+    'recorded_vec_env_step': benchmark_recorded_vec_env_step,
+    'get_state': benchmark_get_state,
+    'get_legal_actions': benchmark_get_legal_actions,
+    'get_legal_mask': benchmark_get_legal_mask,
+    'env_snapshot': benchmark_env_snapshot,
+    'env_clone': benchmark_env_clone,
+    'deck': benchmark_deck,
+    'replay_sample': benchmark_replay_sample,
+    'packed_replay_sample': benchmark_packed_replay_sample,
+    'prioritized_replay_sample': benchmark_prioritized_replay_sample,
+    'train_iteration': benchmark_train_iteration,
+    'fused_train_iteration': benchmark_fused_train_iteration,
+    'runtest': benchmark_runtest,
+}
+
+
+def run_benchmarks(names):
+    results = {}
+    for name in names:
+        seed_everything()
+        try:
+            value, unit, higher_is_better = BENCHMARKS[name]()
+        except ImportError as error:
+            print(f'{name}: skipped ({error})')
+            continue
+        results[name] = {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+        print(f'{name}: {value:.2f} {unit}')
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Returns the names of benchmarks that got worse than baseline by more than tolerance
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]['value']
+        change = result['value'] / old - 1 if result['higher_is_better'] else old / result['value'] - 1
+        regressed = change < -tolerance
+        print(f'{name}: {old:.2f} -> {result["value"]:.2f} {result["unit"]} ({change:+.1%})'
+              + (' REGRESSION' if regressed else ''))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmarks', nargs='*', default=list(BENCHMARKS), help='benchmarks to run, all by default')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative slowdown against the baseline reported as a regression')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.benchmarks)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'seed': SEED, 'python': platform.python_version(), 'numpy': np.__version__,
+                       'machine': platform.machine(), 'benchmarks': results}, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)['benchmarks'], args.tolerance)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class CachedModel:
+    """
+        Least recently used cache of Q-values in front of a model, keyed by
+        the bit packed state. Only the states missing from the cache are
+        predicted, in one batch. set_weights and reload bump the generation,
+        which empties the cache, and values predicted with older weights are
+        not stored. Safe to share between threads.
+    """
+    def __init__(self, model, max_size=100000):
+        self.model = model
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get_weights(self):
+        return self.model.get_weights()
+
+    def set_weights(self, weights):
+        self.model.set_weights(weights)
+        self.invalidate()
+
+    def reload(self, model):
+        self.model = model
+        self.invalidate()
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.cache.clear()
+
+    def predict(self, states, batch_size=None, verbose=0):
+        # Same call signature as Keras Model.predict
+        states = np.asarray(states)
+        keys = [row.tobytes() for row in np.packbits(states.reshape(len(states), -1), axis=1)]
+        values = [None] * len(keys)
+        missing = []
+        with self.lock:
+            generation = self.generation
+            for index, key in enumerate(keys):
+                value = self.cache.get(key)
+                if value is None:
+                    missing.append(index)
+                else:
+                    self.cache.move_to_end(key)
+                    values[index] = value
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if not missing:
+            return np.stack(values)
+
+        if len(missing) == len(keys):
+            predicted = result = np.asarray(self.model.predict(states, batch_size=len(states), verbose=0))
+        else:
+            predicted = np.asarray(self.model.predict(states[missing], batch_size=len(missing), verbose=0))
+            for index, value in zip(missing, predicted):
+                values[index] = value
+            result = np.stack(values)
+        with self.lock:
+            # Values of weights replaced during the prediction are not cached
+            if generation == self.generation:
+                for index, value in zip(missing, predicted):
+                    self.cache[keys[index]] = value.copy()
+                while len(self.cache) > self.max_size:
+                    self.cache.popitem(last=False)
+        return result
@@ -1,12 +1,42 @@
+import numpy as np
+from collections import namedtuple
 from termcolor import colored
+from utils import COLORS
 
+TRAITS = ('0', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'skip', 'reverse', 'draw_2', 'wild', 'draw_4')
+SKIP, REVERSE, DRAW_2, WILD, DRAW_4 = range(10, 15)
+WILD_ACTION = 52
+DRAW_4_ACTION = 53
+DRAW_ACTION = 54
+DECK_SIZE = 108
 
-class Card:
-    def __init__(self, color, type, trait, action_number):
-        self.color = color
-        self.type = type
-        self.trait = trait
-        self.action_number = action_number
+# Color (4 = wild) and trait index of every card kind, indexed by action number
+ACTION_COLOR = np.array([action // 13 for action in range(52)] + [4, 4], dtype=np.int8)
+ACTION_TRAIT = np.array([action % 13 for action in range(52)] + [WILD, DRAW_4], dtype=np.int8)
+
+# Cell of every card kind in a flattened 5 x 15 (color x trait) plane
+ACTION_CELL = ACTION_COLOR.astype(np.int64) * 15 + ACTION_TRAIT
+
+# Action number, color and trait index of the 108 cards, indexed by card id
+CARD_ACTION = np.array([number + 13 * color for color in range(COLORS) for number in range(10)]
+                       + [number + 1 + 13 * color for color in range(COLORS) for number in range(9)]
+                       + [trait + 13 * color for trait in (SKIP, REVERSE, DRAW_2)
+                          for _ in range(2) for color in range(COLORS)]
+                       + [WILD_ACTION] * 4 + [DRAW_4_ACTION] * 4, dtype=np.int8)
+CARD_COLOR = ACTION_COLOR[CARD_ACTION]
+CARD_TRAIT = ACTION_TRAIT[CARD_ACTION]
+
+
+class Card(namedtuple('Card', ['color', 'type', 'trait', 'action_number'])):
+    # Immutable object view of a card kind, shared through CARDS
+    __slots__ = ()
+
+    @staticmethod
+    def from_action(action_number, color=None):
+        card = CARDS[action_number]
+        if color is not None:
+            card = card._replace(color=color)
+        return card
 
     def __repr__(self):
         return str(self.color) + ' - ' + str(self.type) + ' - ' + str(self.trait) \
@@ -33,6 +63,13 @@ class Card:
         print('\n')
 
 
+def card_type(trait):
+    if trait < SKIP:
+        return "number"
+    if trait < WILD:
+        return "action"
+    return "wild"
 
 
-
+CARDS = tuple(Card(int(ACTION_COLOR[action]), card_type(ACTION_TRAIT[action]), TRAITS[ACTION_TRAIT[action]], action)
+              for action in range(54))
@@ -0,0 +1,113 @@
+import argparse
+import subprocess
+import sys
+import numpy as np
+from card import ACTION_CELL, ACTION_COLOR, ACTION_TRAIT, DRAW_4_ACTION, DRAW_ACTION, WILD
+from environment import UnoEnvironment
+from rules import ACTION_COUNT, legal_masks_from_states, masked_sample
+from vec_environment import VecUnoEnvironment
+
+# Publishes more weights than fit in the pipe of the queue while the evaluator is busy and stops it, as the
+# learner of mydqnagent.py --evaluate does when training ends
+EVALUATOR_SHUTDOWN = '''
+import os, tempfile
+import numpy as np
+from background_evaluator import BackgroundEvaluator
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        evaluator = BackgroundEvaluator(os.path.join(directory, 'metrics.jsonl'), games=64, number_of_games=64)
+        evaluator.start()
+        for _ in range(2):
+            evaluator.publish_weights([np.zeros((450, 64))] * 8)
+        evaluator.stop()
+'''
+
+
+def reference_state(hand, opponent_hand_size, top, top_color):
+    # Encoded from scratch like the card object get_state did, one plane per count of a card kind
+    state = np.zeros((6, 5 * 15), dtype=np.uint8)
+    for action in np.flatnonzero(hand):
+        state[hand[action] - 1, ACTION_CELL[action]] = 1
+    state[4, top_color * 15 + ACTION_TRAIT[top]] = 1
+    state[5, :opponent_hand_size] = 1
+    return state.flatten()
+
+
+def reference_legal_mask(hand, top, top_color):
+    # Card by card like the card object get_legal_actions did
+    mask = np.zeros(ACTION_COUNT, dtype=bool)
+    for action in np.flatnonzero(hand[:DRAW_4_ACTION]):
+        mask[action] = ACTION_TRAIT[action] == WILD or ACTION_COLOR[action] == top_color or \
+            (ACTION_TRAIT[top] < WILD and ACTION_TRAIT[action] == ACTION_TRAIT[top])
+    if hand[DRAW_4_ACTION] > 0 and not mask.any():
+        mask[DRAW_4_ACTION] = True
+    mask[DRAW_ACTION] = True
+    return mask
+
+
+def check_environment(steps, seed, number_of_players=2):
+    # The incremental encoder and the count vector hands of UnoEnvironment against the references
+    env = UnoEnvironment(number_of_players, seed=seed)
+    rng = np.random.default_rng(seed)
+    for step in range(steps):
+        player = env.players[env.current_player]
+        opponent = env.players[(env.current_player + env.turn_direction) % env.number_of_players]
+        state = env.get_state()
+        mask = env.get_legal_mask()
+        assert np.array_equal(state, reference_state(player.hand, opponent.get_hand_size(), env.top, env.top_color)), \
+            f'UnoEnvironment state differs at step {step}'
+        assert np.array_equal(mask, reference_legal_mask(player.hand, env.top, env.top_color)), \
+            f'UnoEnvironment legal mask differs at step {step}'
+        assert np.array_equal(legal_masks_from_states(state[None])[0], mask), \
+            f'legal mask of the UnoEnvironment state differs at step {step}'
+        _, _, done, _ = env.step(masked_sample(mask, rng))
+        if done:
+            env.reset()
+
+
+def check_vec_environment(steps, seed, number_of_players=2, number_of_games=64):
+    # States and legal masks of VecUnoEnvironment against the references and legal_masks_from_states
+    env = VecUnoEnvironment(number_of_games, number_of_players, seed=seed)
+    states, legal_masks = env.reset()
+    rng = np.random.default_rng(seed)
+    for step in range(steps):
+        assert np.array_equal(legal_masks_from_states(states), legal_masks), \
+            f'legal masks of the VecUnoEnvironment states differ at step {step}'
+        opponents = (env.current_player + env.turn_direction) % env.number_of_players
+        for game in range(number_of_games):
+            hand = env.hands[game, env.current_player[game]]
+            top, top_color = env.top[game], env.top_color[game]
+            opponent_hand_size = env.hands[game, opponents[game]].sum()
+            assert np.array_equal(states[game], reference_state(hand, opponent_hand_size, top, top_color)), \
+                f'VecUnoEnvironment state of game {game} differs at step {step}'
+            assert np.array_equal(legal_masks[game], reference_legal_mask(hand, top, top_color)), \
+                f'VecUnoEnvironment legal mask of game {game} differs at step {step}'
+        states, _, _, legal_masks = env.step(masked_sample(legal_masks, rng))
+
+
+def check_evaluator_shutdown(timeout=60):
+    # A process using a BackgroundEvaluator has to exit after stopping it, whatever is left in its queue
+    try:
+        subprocess.run([sys.executable, '-c', EVALUATOR_SHUTDOWN], check=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise AssertionError(f'process of a stopped BackgroundEvaluator did not exit within {timeout} s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks that the encoded states and legal masks of the '
+                                                 'environments match straightforward reference implementations '
+                                                 'and that the background evaluator shuts down')
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        # With more than two players the opponent depends on the turn direction
+        for number_of_players in (2, 3):
+            check_environment(args.steps, args.seed, number_of_players)
+            check_vec_environment(args.steps, args.seed, number_of_players)
+        check_evaluator_shutdown()
+    except AssertionError as error:
+        print(error)
+        sys.exit(1)
+    print('All checks passed')
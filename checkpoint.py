@@ -0,0 +1,129 @@
+import json
+import os
+import queue
+import shutil
+import threading
+import numpy as np
+
+WEIGHT_LISTS = ('model', 'target_model', 'optimizer')
+
+
+def optimizer_variables(optimizer):
+    variables = optimizer.variables
+    return variables() if callable(variables) else variables
+
+
+def get_optimizer_weights(model):
+    optimizer = model.optimizer
+    if hasattr(optimizer, 'get_weights'):
+        return optimizer.get_weights()
+    return [variable.numpy() for variable in optimizer_variables(optimizer)]
+
+
+def set_optimizer_weights(model, weights):
+    # Optimizer slots only exist after the first update, so they are created before being assigned
+    optimizer = model.optimizer
+    if hasattr(optimizer, 'set_weights'):
+        optimizer._create_all_weights(model.trainable_weights)
+        optimizer.set_weights(weights)
+    else:
+        optimizer.build(model.trainable_variables)
+        for variable, weight in zip(optimizer_variables(optimizer), weights):
+            variable.assign(weight)
+
+
+def checkpoint_paths(directory):
+    # Complete checkpoints in directory, oldest first
+    names = [name for name in os.listdir(directory) if name.startswith('checkpoint_') and not name.endswith('.tmp')]
+    return sorted(os.path.join(directory, name) for name in names)
+
+
+def load_checkpoint(path, replay=True):
+    with open(os.path.join(path, 'state.json')) as file:
+        state = json.load(file)
+    snapshot = {'iteration': state['iteration'], 'epsilon': state['epsilon'], 'counters': state['counters']}
+    with np.load(os.path.join(path, 'weights.npz')) as weights:
+        for name in WEIGHT_LISTS:
+            snapshot[name] = [weights[f'{name}_{index}'] for index in range(state['lengths'][name])]
+    replay_path = os.path.join(path, 'replay.npz')
+    if replay and os.path.exists(replay_path):
+        with np.load(replay_path) as replay_arrays:
+            snapshot['replay'] = {key: replay_arrays[key] for key in replay_arrays.files}
+    return snapshot
+
+
+class Checkpointer:
+    """
+        Writes training snapshots to numbered checkpoint directories from a
+        background thread, so the learner only pays for taking the snapshot.
+        A checkpoint is written under a temporary name and renamed when
+        complete, load_latest only considers complete checkpoints. While a
+        checkpoint is still being written newer ones are skipped, keep is the
+        number of checkpoints kept on disk.
+    """
+    def __init__(self, directory, keep=3):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        self.snapshots = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self.write_snapshots, daemon=True)
+        self.thread.start()
+        self.written = 0
+        self.skipped = 0
+        self.error = None
+
+    def save(self, snapshot, block=False):
+        # Returns False when the previous checkpoint is still being written and block is not set
+        try:
+            self.snapshots.put(snapshot, block=block)
+        except queue.Full:
+            self.skipped += 1
+            return False
+        return True
+
+    def ready(self):
+        # True when save would take a snapshot without blocking, only the caller of save can change that
+        return not self.snapshots.full()
+
+    def close(self):
+        self.snapshots.put(None)
+        self.thread.join()
+
+    def write_snapshots(self):
+        while True:
+            snapshot = self.snapshots.get()
+            if snapshot is None:
+                break
+            try:
+                self.write(snapshot)
+                self.written += 1
+            except OSError as error:
+                self.error = error
+                print("Checkpoint failed: " + str(error))
+
+    def checkpoints(self):
+        return checkpoint_paths(self.directory)
+
+    def write(self, snapshot):
+        path = os.path.join(self.directory, f'checkpoint_{snapshot["iteration"]:09d}')
+        temporary = path + '.tmp'
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+
+        weights = {f'{name}_{index}': weight for name in WEIGHT_LISTS for index, weight in enumerate(snapshot[name])}
+        np.savez(os.path.join(temporary, 'weights.npz'), **weights)
+        if snapshot.get('replay') is not None:
+            np.savez(os.path.join(temporary, 'replay.npz'), **snapshot['replay'])
+        state = {'iteration': snapshot['iteration'], 'epsilon': snapshot['epsilon'], 'counters': snapshot['counters'],
+                 'lengths': {name: len(snapshot[name]) for name in WEIGHT_LISTS}}
+        with open(os.path.join(temporary, 'state.json'), 'w') as file:
+            json.dump(state, file)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temporary, path)
+        for old in self.checkpoints()[:-self.keep]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def load_latest(self):
+        paths = self.checkpoints()
+        return load_checkpoint(paths[-1]) if paths else None
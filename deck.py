@@ -1,50 +1,51 @@
-from card import Card
-from random import shuffle
-from utils import COLORS
+import numpy as np
+from card import Card, CARD_ACTION, DECK_SIZE
 
 
 class Deck:
-
-    def __init__(self):
-        self.deck = self.generate_deck()
+    # Cards left to draw are cards[position:end], drawing only moves position
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.cards = self.generate_deck()
+        self.position = 0
+        self.end = DECK_SIZE
         self.shuffle_deck()
 
     @staticmethod
     def generate_deck():
-        # Create 0 - 9  for each color
-        cards = [Card(color, "number", str(number), number+13*color) for color in range(COLORS) for number in range(10)]
-
-        # Create 1 - 9 for each color
-        cards += [Card(color, "number", str(number+1), number+1 + 13 * color) for color in range(COLORS) for number in range(9)]
-
-        # Create skip for each color
-        cards += [Card(color, "action", "skip", 10 + 13 * color) for color in range(COLORS)]
-        cards += [Card(color, "action", "skip", 10 + 13 * color) for color in range(COLORS)]
-
-        # Create reverse for each color
-        cards += [Card(color, "action", "reverse", 11 + 13 * color) for color in range(COLORS)]
-        cards += [Card(color, "action", "reverse", 11 + 13 * color) for color in range(COLORS)]
+        # Action numbers of the 108 cards, looked up by card id
+        return CARD_ACTION.copy()
 
-        # Create draw_2 for each color
-        cards += [Card(color, "action", "draw_2", 12 + 13 * color) for color in range(COLORS)]
-        cards += [Card(color, "action", "draw_2", 12 + 13 * color) for color in range(COLORS)]
+    def copy(self, rng):
+        deck = Deck.__new__(Deck)
+        deck.rng = rng
+        deck.cards = self.cards.copy()
+        deck.position = self.position
+        deck.end = self.end
+        return deck
 
-        # Create wild cards
-        cards += [Card(4, "wild", "wild", 52) for color in range(COLORS)]
+    @property
+    def deck(self):
+        return self.cards[self.position:self.end]
 
-        # Create draw_4 cards
-        cards += [Card(4, "wild", "draw_4", 53) for color in range(COLORS)]
-
-        return cards
+    def __len__(self):
+        return self.end - self.position
 
     def shuffle_deck(self):
-        shuffle(self.deck)
+        self.rng.shuffle(self.cards[self.position:self.end])
 
     def draw_cards(self, number=7):
-        drawn_cards = self.deck[:number]
-        del self.deck[:number]
+        # View into the deck, valid until cards are added back
+        drawn_cards = self.cards[self.position:min(self.position + number, self.end)]
+        self.position += len(drawn_cards)
         return drawn_cards
 
-    def pretty_print_deck(self):
-        Card.pretty_print_cards(self.cards, False)
+    def add_cards(self, cards):
+        remaining = self.end - self.position
+        self.cards[:remaining] = self.cards[self.position:self.end]
+        self.cards[remaining:remaining + len(cards)] = cards
+        self.position = 0
+        self.end = remaining + len(cards)
 
+    def pretty_print_deck(self):
+        Card.pretty_print_cards([Card.from_action(card) for card in self.deck], False)
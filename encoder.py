@@ -0,0 +1,84 @@
+import copy
+import numpy as np
+from card import ACTION_CELL, ACTION_TRAIT, WILD
+from utils import COLORS
+
+PLANE_CELLS = 5 * 15
+
+'''
+    Opponents hand size is encoded by setting its first hand_size cells
+    0,0,0 = 1 --> 1 card
+    0,0,1 = 1 --> 2 cards
+    ...
+    0,0,14 = 1 --> 15 cards
+    0,1,0 = 1 --> 16 cards
+'''
+HAND_SIZE_ENCODING = (np.arange(PLANE_CELLS)[None, :] < np.arange(PLANE_CELLS + 1)[:, None]).astype(np.uint8)
+
+# Top card plane for every chosen color and action number, wild cards take the chosen color
+TOP_ENCODING = np.zeros((COLORS, 54, PLANE_CELLS), dtype=np.uint8)
+for color in range(COLORS):
+    TOP_ENCODING[color, np.arange(54), np.where(ACTION_TRAIT >= WILD, color * 15 + ACTION_TRAIT, ACTION_CELL)] = 1
+
+
+def encode_hand_size(hand_size):
+    return HAND_SIZE_ENCODING[min(hand_size, PLANE_CELLS)]
+
+
+class StateEncoder:
+    """
+        Keeps the 6 x 5 x 15 state of every seat and updates only the cells
+        touched by a move. hands are the count vectors of the players, which
+        the encoder reads after the game changed them.
+    """
+    def __init__(self, hands, top, top_color, turn_direction=1):
+        self.hands = hands
+        self.number_of_players = len(hands)
+        self.states = np.zeros((self.number_of_players, 6, PLANE_CELLS), dtype=np.uint8)
+        self.hand_sizes = np.zeros(self.number_of_players, dtype=np.int64)
+        self.turn_direction = turn_direction
+        self.top = top
+        self.top_color = top_color
+        for seat, hand in enumerate(hands):
+            cards = np.flatnonzero(hand)
+            self.states[seat, hand[cards] - 1, ACTION_CELL[cards]] = 1
+            self.hand_sizes[seat] = hand.sum()
+        self.states[:, 4] = TOP_ENCODING[top_color, top]
+        self.set_turn_direction(turn_direction)
+
+    def copy(self, hands):
+        # Same state for the given copies of the hands
+        encoder = copy.copy(self)
+        encoder.hands = hands
+        encoder.states = self.states.copy()
+        encoder.hand_sizes = self.hand_sizes.copy()
+        return encoder
+
+    def get_state(self, seat):
+        # Copy, the buffer keeps changing with the game
+        return self.states[seat].flatten()
+
+    def update_cards(self, seat, cards, hand_size):
+        hand = self.hands[seat]
+        for card in cards:
+            cell = ACTION_CELL[card]
+            count = hand[card]
+            self.states[seat, :4, cell] = 0
+            if count:
+                self.states[seat, count - 1, cell] = 1
+        self.hand_sizes[seat] = hand_size
+        # Only the seat that sees this player as its opponent changes
+        observer = (seat - self.turn_direction) % self.number_of_players
+        self.states[observer, 5] = encode_hand_size(self.hand_sizes[seat])
+
+    def set_top(self, top, top_color):
+        if top != self.top or top_color != self.top_color:
+            self.top = top
+            self.top_color = top_color
+            self.states[:, 4] = TOP_ENCODING[top_color, top]
+
+    def set_turn_direction(self, turn_direction):
+        self.turn_direction = turn_direction
+        for seat in range(self.number_of_players):
+            opponent = (seat + turn_direction) % self.number_of_players
+            self.states[seat, 5] = encode_hand_size(self.hand_sizes[opponent])
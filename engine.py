@@ -0,0 +1,58 @@
+from card import Card
+from environment import UnoEnvironment
+from game_record import ENGINE_RULES
+
+
+class UnoEngine(UnoEnvironment):
+    """
+        Headless UNO game between one policy per seat, played in a flat loop.
+        Unlike UnoEnvironment the turn passes after every move, skipping cards
+        skip the next player. A policy has an act(game) method returning the
+        action for the current player.
+    """
+    RULES = ENGINE_RULES
+
+    def __init__(self, policies, names=None, first_player=0, seed=None, recorder=None):
+        super().__init__(len(policies), seed, recorder)
+        self.policies = policies
+        self.names = names or ['Player ' + str(seat) for seat in range(len(policies))]
+        self.first_player = first_player
+        self.current_player = first_player
+        self.winner = None
+
+    def reset(self):
+        super().reset()
+        self.current_player = self.first_player
+        self.winner = None
+
+    def snapshot(self):
+        return super().snapshot() + (self.winner,)
+
+    def restore(self, snapshot):
+        super().restore(snapshot[:-1])
+        self.winner = snapshot[-1]
+
+    def play_turn(self):
+        seat = self.current_player
+        self.apply_action(self.policies[seat].act(self))
+        if self.done:
+            self.winner = seat
+        else:
+            self.skip()
+
+    def play(self):
+        while not self.done:
+            self.play_turn()
+        return self.winner
+
+    def pretty_print_state(self):
+        print("-------------------------------------------------------------------------------------------------------")
+        print("Revealed card:")
+        Card.pretty_print_cards([Card.from_action(self.top, self.top_color)], False)
+
+        for player in range(self.number_of_players):
+            if player == self.current_player:
+                print("ACTIVE-", end='')
+            print(self.names[player] + ":")
+            self.players[player].print_hand()
+        print("-------------------------------------------------------------------------------------------------------")
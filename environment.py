@@ -1,7 +1,11 @@
+import copy
 import numpy as np
+from card import ACTION_COLOR, ACTION_TRAIT, DRAW_ACTION, SKIP, REVERSE, DRAW_2, WILD, DRAW_4
 from player import Player
 from deck import Deck
-from collections import Counter
+from rules import legal_mask
+from encoder import StateEncoder
+from game_record import ENVIRONMENT_RULES, GameRecord, RecordingRandom
 from utils import COLORS
 
 
@@ -14,165 +18,190 @@ class UnoEnvironment:
                       'wild': 13, 'draw_4': 14}
     ACTION_COUNT = 55
     STATE_SIZE = 6 * 5 * 15
-
-    def __init__(self, number_of_players=2):
-        self.deck = Deck()
+    RULES = ENVIRONMENT_RULES
+    first_player = 0
+
+    def __init__(self, number_of_players=2, seed=None, recorder=None):
+        self.rng = np.random.default_rng(seed)
+        # Finished games are written to recorder, with the deals and wild colors drawn from the generator.
+        # Once a snapshot was taken a game is only written when it is reset, rollouts to the end of the
+        # game are restored before that
+        self.recorder = recorder
+        self.actions = []
+        self.record_deferred = False
+        self.record_winner = None
+        if recorder is not None:
+            self.rng = RecordingRandom(self.rng)
+        self.deck = Deck(self.rng)
         self.number_of_players = number_of_players
         self.players = [Player(self.deck.draw_cards(7)) for player in range(self.number_of_players)]
-        self.played_card = None
         self.played_cards = self.reveal_top_card()
         self.top = self.played_cards[-1]
+        self.top_color = ACTION_COLOR[self.top]
         self.turn_direction = 1
+        self.encoder = StateEncoder([player.hand for player in self.players], self.top, self.top_color)
         self.current_player = 0
         self.reward = 0
         self.turn = 0
         self.done = False
 
     def reset(self):
-        self.deck = Deck()
+        if self.recorder is not None:
+            if self.record_deferred and self.done:
+                self.record_game(self.record_winner)
+            self.record_deferred = False
+            self.rng.clear()
+            self.actions = []
+        self.deck = Deck(self.rng)
         self.players = [Player(self.deck.draw_cards(7)) for player in range(self.number_of_players)]
-        self.played_card = None
         self.played_cards = self.reveal_top_card()
-        self.top = self.played_cards[len(self.played_cards) - 1]
+        self.top = self.played_cards[-1]
+        self.top_color = ACTION_COLOR[self.top]
         self.turn_direction = 1
+        self.encoder = StateEncoder([player.hand for player in self.players], self.top, self.top_color)
         self.current_player = 0
         self.reward = 0
         self.turn = 0
         self.done = False
 
     def get_state(self):
-        state = np.zeros((6, 5, 15), dtype=int)
-        player_hand = self.players[self.current_player].cards
-        encoded_hand = self.encode_hand(player_hand)
-        state[:4] = encoded_hand
-        state[4] = self.encode_top(self.top)
-        encoded_opp = self.encode_opp_hand(
-            self.players[(self.current_player + self.turn_direction) % self.number_of_players].get_hand_size())
-        state[5:] = encoded_opp
-
-        return state.flatten()
+        return self.encoder.get_state(self.current_player)
+
+    def snapshot(self):
+        # Flat copy of the game state including the random generator and what was recorded of the game,
+        # restore returns to it
+        record = None
+        if self.recorder is not None:
+            self.record_deferred = True
+            record = (list(self.actions), list(self.rng.shuffles), list(self.rng.colors), self.record_winner)
+        return (self.deck.cards.copy(), self.deck.position, self.deck.end,
+                [player.hand.copy() for player in self.players], [player.hand_size for player in self.players],
+                list(self.played_cards), self.top, self.top_color, self.turn_direction, self.current_player,
+                self.reward, self.turn, self.done, self.encoder.states.copy(), self.encoder.hand_sizes.copy(),
+                self.rng.bit_generator.state, record)
+
+    def restore(self, snapshot):
+        # Arrays are restored in place, the encoder keeps reading the same hands
+        (cards, self.deck.position, self.deck.end, hands, hand_sizes, played_cards, self.top, self.top_color,
+         self.turn_direction, self.current_player, self.reward, self.turn, self.done, states, encoder_hand_sizes,
+         rng_state, record) = snapshot
+        self.deck.cards[...] = cards
+        for player, hand, hand_size in zip(self.players, hands, hand_sizes):
+            player.hand[...] = hand
+            player.hand_size = hand_size
+        self.played_cards = list(played_cards)
+        self.encoder.states[...] = states
+        self.encoder.hand_sizes[...] = encoder_hand_sizes
+        self.encoder.top = self.top
+        self.encoder.top_color = self.top_color
+        self.encoder.turn_direction = self.turn_direction
+        self.rng.bit_generator.state = rng_state
+        if record is not None:
+            actions, shuffles, colors, self.record_winner = record
+            self.actions = list(actions)
+            self.rng.shuffles = list(shuffles)
+            self.rng.colors = list(colors)
+
+    def clone(self):
+        # Independent copy of the game with its own generator in the same state. Creating the generator
+        # dominates, rollouts should clone once and return to a snapshot between runs
+        clone = copy.copy(self)
+        clone.recorder = None
+        clone.rng = np.random.Generator(type(self.rng.bit_generator)())
+        clone.rng.bit_generator.state = self.rng.bit_generator.state
+        clone.deck = self.deck.copy(clone.rng)
+        clone.players = [player.copy() for player in self.players]
+        clone.played_cards = list(self.played_cards)
+        clone.encoder = self.encoder.copy([player.hand for player in clone.players])
+        return clone
+
+    def determinize(self, seat, rng=None):
+        # Redeals the cards seat can not see, the other hands and the deck, keeping their sizes
+        if rng is None:
+            # The redeal is drawn from the generator itself, a recording generator would log it as a reshuffle
+            rng = self.rng.rng if self.recorder is not None else self.rng
+        others = [player for other, player in enumerate(self.players) if other != seat]
+        unseen = np.concatenate([self.deck.deck] + [np.repeat(np.arange(54), player.hand) for player in others])
+        rng.shuffle(unseen)
+        dealt = 0
+        for player in others:
+            player.hand[...] = np.bincount(unseen[dealt:dealt + player.hand_size], minlength=54)
+            dealt += player.hand_size
+        self.deck.cards[self.deck.position:self.deck.end] = unseen[dealt:]
+        self.encoder = StateEncoder([player.hand for player in self.players], self.top, self.top_color,
+                                    self.turn_direction)
 
     def state_size(self):
         return len(self.get_state())
 
-    def encode_hand(self, hand):
-        counted_hand = self.count_cards(hand)
-        encoded_hand = np.zeros((4, 5, 15), dtype=int)
-
-        for card, count in counted_hand.items():
-            color = card[0]
-            trait = self.TRAIT_TO_INDEX[card[2]]
-            encoded_hand[count - 1][color][trait] = 1
-        return encoded_hand
-
-    ''' 
-        Encodes opponents hand size
-        0,0,0 = 1 --> 1 card
-        0,0,1 = 1 --> 2 cards
-        ...
-        0,0,14 = 1 --> 15 cards
-        0,1,0 = 1 --> 16 cards
-    '''
-    def encode_opp_hand(self, hand_size):
-        encoded_hand_size = np.zeros((1, 5, 15), dtype=int)
-        for count in range(hand_size):
-            index = 0
-            if count >= 15:
-                index = count / 15
-                count = count % 15
-            encoded_hand_size[0][int(index)][int(count)] = 1
-        return encoded_hand_size
-
-    def encode_top(self, top):
-        encoded_top = np.zeros((1, 5, 15), dtype=int)
-        encoded_top[0][top.color][self.TRAIT_TO_INDEX[top.trait]] = 1
-        return encoded_top
-
-    def count_cards(self, hand):
-        return Counter((card.color, card.type, card.trait, card.action_number) for card in hand)
-
     def reveal_top_card(self):
-        revealed_cards = self.deck.draw_cards(1)
-        while revealed_cards[-1].type != "number":
-            revealed_cards += self.deck.draw_cards(1)
-
-        return revealed_cards
+        # Cards are revealed until a number card is on top
+        first_number = np.argmax(ACTION_TRAIT[self.deck.deck] < SKIP)
+        return self.deck.draw_cards(first_number + 1).tolist()
 
     def step(self, action):
+        self.apply_action(action)
+        return self.get_state(), self.reward, self.done, self.turn
+
+    def apply_action(self, action):
         self.turn += 1
-        player = self.players[self.current_player]
+        seat = self.current_player
+        player = self.players[seat]
         skip = False
-        if action != 54:
-            index = [card.action_number for card in player.cards].index(action)
-            self.played_card = player.cards[index]
-        else:
-            # Action is draw
-            self.played_card = None
+        if self.recorder is not None:
+            self.actions.append(action)
 
-        if not self.played_card:
-            self.draw_cards(player, 1)
+        if action == DRAW_ACTION:
+            self.draw_cards(self.current_player, 1)
             self.reward = self.DRAW_CARD_REWARD
         else:
-            if self.played_card.trait == "skip":
+            trait = ACTION_TRAIT[action]
+            self.played_cards.append(player.play_card(action))
+            self.encoder.update_cards(self.current_player, (action,), player.get_hand_size())
+            self.top = action
+            self.top_color = ACTION_COLOR[action]
+            if trait == SKIP:
                 skip = True  # self.skip()
-            elif self.played_card.trait == "reverse":
+            elif trait == REVERSE:
                 self.reverse_turn()
-            elif self.played_card.trait == "draw_2":
-                self.draw_cards(self.players[(self.current_player + self.turn_direction) % self.number_of_players], 2)
+            elif trait == DRAW_2:
+                self.draw_cards((self.current_player + self.turn_direction) % self.number_of_players, 2)
                 skip = True  # self.skip()
-            elif self.played_card.trait == "wild":
-                self.played_card.color = np.random.randint(COLORS)
-            elif self.played_card.trait == "draw_4":
-                self.draw_cards(self.players[(self.current_player + self.turn_direction) % self.number_of_players], 4)
-                self.played_card.color = np.random.randint(COLORS)
+            elif trait == WILD:
+                self.top_color = self.rng.integers(COLORS)
+            elif trait == DRAW_4:
+                self.draw_cards((self.current_player + self.turn_direction) % self.number_of_players, 4)
+                self.top_color = self.rng.integers(COLORS)
                 skip = True  # self.skip()
+            self.encoder.set_top(self.top, self.top_color)
             self.reward = self.CARD_PLAYED_REWARD
-            self.played_cards.append(player.play_card(index))
 
-        if len(player.cards) == 0 or self.number_of_players == 1:
+        if player.get_hand_size() == 0 or self.number_of_players == 1:
             self.reward += self.WIN_REWARD
             self.done = True
+            self.record_winner = seat
+            if self.recorder is not None and not self.record_deferred:
+                self.record_game(seat)
 
         if skip:
             self.skip()
-        return self.get_state(), self.reward, self.done, self.turn
 
-    def get_legal_actions(self):
-        player = self.players[self.current_player]
-        self.top = self.played_cards[-1]
-        legal_actions = []
-        draw_4_actions = []
-        if self.top.type == "wild":
-            for card in player.cards:
-                if card.type == "wild":
-                    if card.trait == "draw_4":
-                        draw_4_actions = card.action_number
-                    else:
-                        legal_actions.append(card.action_number)
-                if card.color == self.top.color:
-                    legal_actions.append(card.action_number)
+    def record_game(self, winner):
+        self.recorder.write(GameRecord(self.RULES, self.number_of_players, self.first_player, winner,
+                                       self.rng.shuffles[0], self.actions, self.rng.colors, self.rng.shuffles[1:]))
 
-        else:
-            for card in player.cards:
-                if card.type == "wild":
-                    if card.trait == "draw_4":
-                        draw_4_actions = card.action_number
-                    else:
-                        legal_actions.append(card.action_number)
-                if card.color == self.top.color or card.trait == self.top.trait:
-                    legal_actions.append(card.action_number)
-
-        # Only if there are no other legal actions except draw, draw_4 is legal
-        if not legal_actions and draw_4_actions:
-            legal_actions.append(draw_4_actions)
-        legal_actions.append(54)
-        return legal_actions
+    def get_legal_mask(self):
+        return legal_mask(self.players[self.current_player].hand, self.top, self.top_color)
+
+    def get_legal_actions(self):
+        return np.flatnonzero(self.get_legal_mask()).tolist()
 
     def skip(self):
         self.current_player = (self.current_player + self.turn_direction) % self.number_of_players
 
     def reverse_turn(self):
         self.turn_direction *= -1
+        self.encoder.set_turn_direction(self.turn_direction)
         if self.number_of_players == 2:
             self.skip()
 
@@ -192,16 +221,18 @@ class UnoEnvironment:
     #         print(-points)
     #     return points
 
-    def draw_cards(self, player, number_of_cards_to_draw):
+    def draw_cards(self, seat, number_of_cards_to_draw):
         # Handle empty deck
-        if len(self.deck.deck) < number_of_cards_to_draw:
+        if len(self.deck) < number_of_cards_to_draw:
             self.shuffle_played_cards_into_deck()
         cards_to_draw = self.deck.draw_cards(number_of_cards_to_draw)
+        player = self.players[seat]
         player.add_cards(cards_to_draw)
+        self.encoder.update_cards(seat, cards_to_draw, player.get_hand_size())
 
     def shuffle_played_cards_into_deck(self):
         temp = [self.played_cards.pop()]
-        self.deck.deck = self.played_cards
+        self.deck.add_cards(self.played_cards)
         self.played_cards = temp
         self.deck.shuffle_deck()
 
@@ -0,0 +1,111 @@
+import sys
+import time
+import numpy as np
+from numpy_model import load_model
+from policies import model_actions, random_agent_actions
+from test import TESTED_AGENT
+from utils import spawn_seeds
+from vec_environment import VecUnoGame
+
+
+def model_policy(model):
+    # Batched counterpart of ModelPolicy for play_games
+    def actions(states, legal_masks, rng):
+        return model_actions(model, states, legal_masks)
+    return actions
+
+
+def random_policy(states, legal_masks, rng):
+    # Batched counterpart of RandomPolicy
+    return random_agent_actions(legal_masks, rng)
+
+
+def play_games(policies, games, number_of_games=1024, first_player=0, seed=None, max_turns=1000, recorder=None):
+    """
+        Plays games between one policy per seat in number_of_games
+        concurrent games and returns the wins of every seat and the summed
+        length of the games. A policy maps (states, legal_masks, rng) of the
+        games it is to move in to their actions. Games still running after
+        max_turns, when every player keeps drawing, end without a winner.
+        The games counted are written to recorder when given, except those without a winner.
+    """
+    concurrent = min(number_of_games, games)
+    # Deals and policy moves draw from separate streams of seed
+    env_seed, policy_seed = spawn_seeds(seed, 2)
+    env = VecUnoGame(concurrent, len(policies), seed=env_seed, first_player=first_player, recorder=recorder)
+    rng = np.random.default_rng(policy_seed)
+    states, legal_masks = env.reset()
+
+    # Every slot plays its share of the games, then keeps stepping with its results ignored
+    remaining = np.full(concurrent, games // concurrent)
+    remaining[:games % concurrent] += 1
+    lengths = np.zeros(concurrent, dtype=np.int64)
+    wins = np.zeros(len(policies), dtype=np.int64)
+    finished = 0
+    total_length = 0
+    actions = np.zeros(concurrent, dtype=np.int64)
+
+    while finished < games:
+        movers = env.current_player.copy()
+        for seat, policy in enumerate(policies):
+            moving = np.flatnonzero(movers == seat)
+            if len(moving):
+                actions[moving] = policy(states[moving], legal_masks[moving], rng)
+
+        states, _, dones, legal_masks = env.step(actions)
+        lengths += 1
+        counted = dones & (remaining > 0)
+        finished += np.count_nonzero(counted)
+        wins += np.bincount(movers[counted], minlength=len(policies))
+        total_length += lengths[counted].sum()
+        remaining[counted] -= 1
+        lengths[dones] = 0
+        env.recorded = remaining > 0
+
+        stalled = np.flatnonzero(lengths >= max_turns)
+        if len(stalled):
+            counted = stalled[remaining[stalled] > 0]
+            finished += len(counted)
+            total_length += lengths[counted].sum()
+            remaining[counted] -= 1
+            lengths[stalled] = 0
+            env.recorded = remaining > 0
+            env.reset_games(stalled)
+            states, legal_masks = env.get_states(), env.get_legal_masks()
+    return wins, int(total_length)
+
+
+class Evaluator:
+    """
+        Plays the tested model against the random agent of UnoTest in
+        number_of_games concurrent games, asking the model for the moves of
+        all games at once. As in runtest.py the tested agent moves first.
+    """
+    def __init__(self, model, number_of_games=1024, seed=None, recorder=None):
+        self.model = model
+        self.number_of_games = number_of_games
+        self.seed = seed
+        self.recorder = recorder
+
+    def evaluate(self, games):
+        policies = [random_policy, random_policy]
+        policies[TESTED_AGENT] = model_policy(self.model)
+
+        start = time.perf_counter()
+        wins, total_length = play_games(policies, games, self.number_of_games, TESTED_AGENT, self.seed,
+                                         recorder=self.recorder)
+        seconds = time.perf_counter() - start
+
+        return {'games': games, 'wins': int(wins[TESTED_AGENT]), 'win_rate': float(wins[TESTED_AGENT] / games),
+                'mean_game_length': float(total_length / games), 'seconds': seconds,
+                'games_per_second': games / seconds}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Please provide path to model")
+    else:
+        games = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+        results = Evaluator(load_model(sys.argv[1])).evaluate(games)
+        for key, value in results.items():
+            print(key + ": " + str(value))
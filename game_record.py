@@ -0,0 +1,192 @@
+import os
+import struct
+import threading
+from collections import namedtuple
+import numpy as np
+from card import DECK_SIZE
+
+RECORDS_FILE = 'games.bin'
+INDEX_FILE = 'games.idx'
+# Turn order of the recorded game, UnoEnvironment and VecUnoEnvironment or UnoEngine and VecUnoGame
+ENVIRONMENT_RULES = 0
+ENGINE_RULES = 1
+# rules, players, first player, winner, actions, wild colors, reshuffles
+HEADER = struct.Struct('<BBBbIIH')
+
+GameRecord = namedtuple('GameRecord', ['rules', 'number_of_players', 'first_player', 'winner', 'deal', 'actions',
+                                       'colors', 'reshuffles'])
+
+
+def encode_record(record):
+    # Header, the shuffled deck, one byte per action and wild color and every reshuffled deck after its length
+    reshuffles = b''.join(bytes([len(cards)]) + np.asarray(cards, dtype=np.int8).tobytes()
+                          for cards in record.reshuffles)
+    return HEADER.pack(record.rules, record.number_of_players, record.first_player, record.winner,
+                       len(record.actions), len(record.colors), len(record.reshuffles)) + \
+        np.asarray(record.deal, dtype=np.int8).tobytes() + np.asarray(record.actions, dtype=np.uint8).tobytes() + \
+        np.asarray(record.colors, dtype=np.uint8).tobytes() + reshuffles
+
+
+def decode_record(data, offset):
+    rules, number_of_players, first_player, winner, actions, colors, reshuffles = HEADER.unpack_from(data, offset)
+    offset += HEADER.size
+    deal = np.frombuffer(data, dtype=np.int8, count=DECK_SIZE, offset=offset)
+    offset += DECK_SIZE
+    actions_array = np.frombuffer(data, dtype=np.uint8, count=actions, offset=offset)
+    offset += actions
+    colors_array = np.frombuffer(data, dtype=np.uint8, count=colors, offset=offset)
+    offset += colors
+    reshuffled = []
+    for _ in range(reshuffles):
+        length = int(data[offset])
+        reshuffled.append(np.frombuffer(data, dtype=np.int8, count=length, offset=offset + 1))
+        offset += 1 + length
+    return GameRecord(rules, number_of_players, first_player, winner, deal, actions_array, colors_array, reshuffled)
+
+
+class RecordingRandom:
+    """
+        Wraps the generator of a recorded game and keeps every shuffled deck
+        and drawn wild color of the current game. Everything else is passed
+        through to the generator.
+    """
+    def __init__(self, rng):
+        self.rng = rng
+        self.clear()
+
+    def clear(self):
+        self.shuffles = []
+        self.colors = []
+
+    def shuffle(self, cards):
+        self.rng.shuffle(cards)
+        self.shuffles.append(cards.copy())
+
+    def integers(self, *args, **kwargs):
+        value = self.rng.integers(*args, **kwargs)
+        self.colors.append(value)
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self.rng, name)
+
+
+class ScriptedRandom:
+    # Generator of a replayed game, hands out the recorded deal, reshuffles and wild colors in order
+    def __init__(self, record):
+        self.shuffles = iter([record.deal] + list(record.reshuffles))
+        self.colors = iter(record.colors.tolist())
+
+    def shuffle(self, cards):
+        cards[...] = next(self.shuffles)
+
+    def integers(self, *args, **kwargs):
+        return next(self.colors)
+
+
+class ReplayPolicy:
+    def __init__(self, actions):
+        self.actions = actions
+
+    def act(self, game):
+        return next(self.actions)
+
+
+class GameRecorder:
+    """
+        Appends finished games to games.bin in a directory and their offsets
+        to games.idx. A game is stored as its deal, one byte per action and
+        wild color and the decks reshuffled from the discard pile, which is
+        enough to replay it exactly. Offsets are written after the records they
+        point to are flushed, every flush_interval games and on close, so
+        readers only see complete games. Safe to share between threads.
+    """
+    def __init__(self, directory, flush_interval=1000):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        self.records = open(os.path.join(directory, RECORDS_FILE), 'ab')
+        self.index = open(os.path.join(directory, INDEX_FILE), 'ab')
+        self.offset = self.records.seek(0, os.SEEK_END)
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def write(self, record):
+        data = encode_record(record)
+        with self.lock:
+            # Games finished by actors still running after close are dropped
+            if self.records.closed:
+                return
+            self.records.write(data)
+            self.pending.append(self.offset)
+            self.offset += len(data)
+            if len(self.pending) >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        self.records.flush()
+        self.index.write(np.array(self.pending, dtype='<i8').tobytes())
+        self.index.flush()
+        self.pending = []
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.records.close()
+            self.index.close()
+
+
+class GameRecordReader:
+    """
+        Random access to the games of a recorder directory, game k is read
+        with one seek through the memory mapped index and records. refresh
+        picks up games flushed since.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.offsets = np.zeros(0, dtype='<i8')
+        self.data = None
+        self.refresh()
+
+    def refresh(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        count = len(self.offsets)
+        if os.path.exists(path) and os.path.getsize(path) >= 8:
+            self.offsets = np.memmap(path, dtype='<i8', mode='r', shape=(os.path.getsize(path) // 8,))
+            self.data = np.memmap(os.path.join(self.directory, RECORDS_FILE), dtype=np.uint8, mode='r')
+        return len(self.offsets) - count
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, game):
+        return decode_record(self.data, int(self.offsets[game]))
+
+    def replay(self, game):
+        return replay(self[game])
+
+
+def replay(record):
+    """
+        Replays a recorded game and yields the game and the recorded action
+        before every turn, the game is finished after the last one. Games
+        recorded with ENGINE_RULES are replayed by an UnoEngine, the others
+        by an UnoEnvironment.
+    """
+    # Imported here, environment imports this module for RecordingRandom
+    from engine import UnoEngine
+    from environment import UnoEnvironment
+
+    actions = record.actions.tolist()
+    if record.rules == ENGINE_RULES:
+        game = UnoEngine([ReplayPolicy(iter(actions))] * record.number_of_players, first_player=record.first_player)
+    else:
+        game = UnoEnvironment(record.number_of_players)
+    game.rng = ScriptedRandom(record)
+    game.reset()
+    for action in actions:
+        yield game, action
+        if record.rules == ENGINE_RULES:
+            game.play_turn()
+        else:
+            game.step(action)
@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from rules import masked_argmax, masked_sample
+
+
+class InferenceService:
+    """
+        Collects observations submitted by many actors and environments and
+        answers them with one forward pass per micro-batch. A batch is run as
+        soon as max_batch_size observations are pending or max_wait seconds
+        passed since the first of them arrived. predict takes an array of
+        states and returns their Q-values. Exploration draws from the rng
+        submitted with a request, so every actor can keep its own stream.
+    """
+    def __init__(self, predict, max_batch_size=1024, max_wait=0.002, seed=None):
+        self.predict_batch = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.rng = np.random.default_rng(seed)
+        self.requests = queue.Queue()
+        self.running = False
+        self.thread = None
+        self.batches = 0
+        self.states_served = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        while not self.requests.empty():
+            self.requests.get_nowait()[3].set_exception(RuntimeError("Inference service stopped"))
+
+    def submit(self, states, legal_masks=None, epsilon=0.0, rng=None):
+        # Future resolving to (q_values, actions), actions are None without legal_masks
+        future = Future()
+        self.requests.put((np.asarray(states), legal_masks, epsilon, future, rng))
+        return future
+
+    def act(self, states, legal_masks, epsilon=0.0, rng=None):
+        return self.submit(states, legal_masks, epsilon, rng).result()
+
+    def predict(self, state):
+        q_values, _ = self.submit(np.asarray(state).reshape(1, -1)).result()
+        return q_values[0]
+
+    def serve(self):
+        while self.running:
+            try:
+                batch = [self.requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            size = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    request = self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self.run_batch(batch)
+
+    def run_batch(self, batch):
+        try:
+            q_values = self.predict_batch(np.concatenate([request[0] for request in batch]))
+        except Exception as exception:
+            for request in batch:
+                request[3].set_exception(exception)
+            return
+        self.batches += 1
+        self.states_served += len(q_values)
+
+        offset = 0
+        for states, legal_masks, epsilon, future, rng in batch:
+            values = q_values[offset:offset + len(states)]
+            offset += len(states)
+            actions = None
+            if legal_masks is not None:
+                actions = masked_argmax(values, legal_masks)
+                if epsilon > 0:
+                    rng = self.rng if rng is None else rng
+                    explore = rng.random(len(states)) < epsilon
+                    actions[explore] = masked_sample(legal_masks[explore], rng)
+            future.set_result((values, actions))
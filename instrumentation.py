@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+
+
+class PhaseTimer:
+    __slots__ = ('instrumentation', 'name', 'start')
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.instrumentation.add_time(self.name, time.perf_counter() - self.start)
+
+
+class Instrumentation:
+    """
+        Per-phase timers, counters and gauges for the training loop. Every
+        interval seconds tick appends a snapshot with the time spent in each
+        phase and the rate of each counter since the last snapshot to path as
+        a JSON line. Without a path snapshots are only kept in last_snapshot.
+    """
+    def __init__(self, path=None, interval=10.0):
+        self.path = path
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.timers = {}
+        self.phase_seconds = {}
+        self.phase_calls = {}
+        self.counters = {}
+        self.gauges = {}
+        self.start_time = time.perf_counter()
+        self.last_time = self.start_time
+        self.last_phase_seconds = {}
+        self.last_phase_calls = {}
+        self.last_counters = {}
+        self.last_snapshot = None
+
+    def phase(self, name):
+        # Reused per name, phases are timed from a single thread
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = PhaseTimer(self, name)
+        return timer
+
+    def add_time(self, name, seconds):
+        self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+        self.phase_calls[name] = self.phase_calls.get(name, 0) + 1
+
+    def count(self, name, amount=1):
+        # Counters are shared with actor threads
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def tick(self):
+        if time.perf_counter() - self.last_time >= self.interval:
+            self.write(self.snapshot())
+
+    def snapshot(self):
+        now = time.perf_counter()
+        interval = now - self.last_time
+        with self.lock:
+            counters = dict(self.counters)
+        phase_seconds = dict(self.phase_seconds)
+        phase_calls = dict(self.phase_calls)
+
+        phases = {}
+        for name, seconds in phase_seconds.items():
+            calls = phase_calls[name] - self.last_phase_calls.get(name, 0)
+            seconds -= self.last_phase_seconds.get(name, 0.0)
+            phases[name] = {'seconds': seconds, 'calls': calls, 'mean_ms': seconds / calls * 1e3 if calls else 0.0,
+                            'share': seconds / interval if interval else 0.0}
+        rates = {name: (value - self.last_counters.get(name, 0)) / interval if interval else 0.0
+                 for name, value in counters.items()}
+
+        self.last_time = now
+        self.last_phase_seconds = phase_seconds
+        self.last_phase_calls = phase_calls
+        self.last_counters = counters
+        self.last_snapshot = {'time': time.time(), 'elapsed': now - self.start_time, 'interval': interval,
+                              'phases': phases, 'counters': counters, 'rates': rates, 'gauges': dict(self.gauges)}
+        return self.last_snapshot
+
+    def write(self, snapshot):
+        if self.path is not None:
+            with open(self.path, 'a') as file:
+                file.write(json.dumps(snapshot) + '\n')
@@ -0,0 +1,48 @@
+import tensorflow as tf
+
+
+def build_train_step(model, target_model, gamma, double_dqn=False):
+    """
+        Compiles one learner update of DQNAgent into a single graph call.
+        As in DQNAgent.train_step target_model is the network being trained
+        and model holds the weights synced from it, which give the targets.
+        Next state values only consider the legal actions of the next state,
+        with double_dqn target_model picks the next action and model values it.
+        The loss is the same as fitting target_model to the predictions of
+        model with the taken action replaced by its target. Returns the TD
+        errors of the batch.
+    """
+    optimizer = target_model.optimizer
+    gamma = tf.constant(gamma, dtype=tf.float32)
+
+    @tf.function
+    def train_step(states, actions, rewards, next_states, dones, next_legal_masks, sample_weights):
+        states = tf.cast(states, tf.float32)
+        next_states = tf.cast(next_states, tf.float32)
+        actions = tf.cast(actions, tf.int32)
+        not_done = 1.0 - tf.cast(dones, tf.float32)
+        lowest = tf.fill(tf.shape(next_legal_masks), tf.float32.min)
+
+        next_q_values = model(next_states, training=False)
+        if double_dqn:
+            next_actions = tf.argmax(tf.where(next_legal_masks, target_model(next_states, training=False), lowest),
+                                     axis=1, output_type=tf.int32)
+            max_future_q = tf.gather(next_q_values, next_actions, batch_dims=1)
+        else:
+            max_future_q = tf.reduce_max(tf.where(next_legal_masks, next_q_values, lowest), axis=1)
+        targets = tf.cast(rewards, tf.float32) + gamma * max_future_q * not_done
+
+        q_values = model(states, training=False)
+        td_errors = targets - tf.gather(q_values, actions, batch_dims=1)
+        taken = tf.one_hot(actions, tf.shape(q_values)[1], on_value=True, off_value=False)
+        y = tf.stop_gradient(tf.where(taken, targets[:, None], q_values))
+
+        with tf.GradientTape() as tape:
+            predictions = target_model(states, training=True)
+            losses = tf.reduce_mean(tf.square(y - predictions), axis=1)
+            loss = tf.reduce_sum(losses * sample_weights) / tf.cast(tf.shape(losses)[0], tf.float32)
+        gradients = tape.gradient(loss, target_model.trainable_variables)
+        optimizer.apply_gradients(zip(gradients, target_model.trainable_variables))
+        return td_errors
+
+    return train_step
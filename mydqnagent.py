@@ -1,25 +1,58 @@
+import argparse
 import threading
 import os
-import random
+import time
 import numpy as np
 import utils
-from collections import deque
-from keras.models import Sequential
-from keras.layers import Dense
-from keras.optimizers import Adam
 from tqdm import tqdm
+from actor_learner import ActorPool
+from background_evaluator import BackgroundEvaluator
+from cached_model import CachedModel
+from checkpoint import Checkpointer, get_optimizer_weights, set_optimizer_weights
 from environment import UnoEnvironment
+from game_record import GameRecorder
+from inference import InferenceService
+from instrumentation import Instrumentation
+from numpy_model import NumpyModel, export_model
+from rate_limiter import RateLimiter
+from replay import PrioritizedReplayMemory, ReplayMemory
+from rules import legal_masks_from_states, masked_argmax, masked_sample
+from trajectory_store import TrajectoryReader, TrajectoryWriter
+from utils import spawn_seeds
+from vec_environment import VecUnoEnvironment
+
+
+def build_model(state_size, action_size, learning_rate):
+    # Keras is imported here, actor and evaluator processes import this module again when they are spawned
+    from keras.models import Sequential
+    from keras.layers import Dense
+    from keras.optimizers import Adam
+    model = Sequential()
+    model.add(Dense(64, input_shape=(state_size,), activation='relu'))
+    model.add(Dense(64, activation='relu'))
+    model.add(Dense(units=64, activation='relu'))
+    model.add(Dense(action_size, activation='linear'))
+    model.compile(loss='mse',
+                  optimizer=Adam(lr=learning_rate))
+    return model
 
 
 class DQNAgent:
 
-    def __init__(self, state_size, action_size):
+    def __init__(self, state_size, action_size, prioritized_replay=False, replay_memory_size=10000,
+                 packed_replay=False, next_state_offset=None, seed=None):
         self.state_size = state_size
         self.action_size = action_size
         self.initialized = False
         self.training = True
-        self.replay_memory_size = 10000
-        self.replay_memory = deque(maxlen=self.replay_memory_size)
+        self.replay_memory_size = replay_memory_size
+        self.prioritized_replay = prioritized_replay
+        if prioritized_replay:
+            self.replay_memory = PrioritizedReplayMemory(self.replay_memory_size, state_size, seed=seed,
+                                                         packed=packed_replay, next_state_offset=next_state_offset)
+        else:
+            self.replay_memory = ReplayMemory(self.replay_memory_size, state_size, seed=seed, packed=packed_replay,
+                                              next_state_offset=next_state_offset)
         self.batch_size = 512
         self.model_update_frequency = 50
         self.gamma = 0.7  # discount factor
@@ -30,95 +63,334 @@ class DQNAgent:
         self.model = self.build_model()
         self.target_model = self.build_model()
         self.target_model.set_weights(self.model.get_weights())
+        # Called with the new weights after every sync of model with target_model
+        self.weight_sync_callbacks = []
+        self.instrumentation = Instrumentation()
+        # Training waits for a batch of transitions with their next states, replace the rate limiter to pace
+        # learner and actors by a replay ratio
+        self.min_replay_size = self.batch_size + (next_state_offset or 0)
+        self.rate_limiter = RateLimiter(self.min_replay_size)
+        # Every transition added to replay memory is also recorded here when set
+        self.trajectory_writer = None
+        self.iteration = 0
+        self.iterations = 1000
+        # Snapshots are handed to checkpointer every checkpoint_interval iterations when set
+        self.checkpointer = None
+        self.checkpoint_interval = 100
+        self.checkpoint_replay = False
+        # CachedModel answering predict and predict_batch when set, it must be invalidated on weight syncs
+        self.q_cache = None
+        # Compiled learner update replacing the predict, predict and fit calls of train_step when set
+        self.fused_train_step = None
 
     def build_model(self):
-        model = Sequential()
-        model.add(Dense(64, input_shape=(6 * 5 * 15,), activation='relu'))
-        model.add(Dense(64, activation='relu'))
-        model.add(Dense(units=64, activation='relu'))
-        model.add(Dense(self.action_size, activation='linear'))
-        model.compile(loss='mse',
-                      optimizer=Adam(lr=self.learning_rate))
-        return model
+        return build_model(self.state_size, self.action_size, self.learning_rate)
+
+    def wait_to_insert(self, count):
+        start = time.perf_counter()
+        self.rate_limiter.wait_to_insert(count)
+        self.instrumentation.count('actor_wait_seconds', time.perf_counter() - start)
 
     def add_transition_to_memory(self, transition):
-        self.replay_memory.append(transition)
+        self.wait_to_insert(1)
+        self.replay_memory.add(*transition)
+        if self.trajectory_writer is not None:
+            self.trajectory_writer.add_batch(*(np.array([value]) for value in transition))
+        self.rate_limiter.inserted(1)
+        self.instrumentation.count('actor_steps')
+
+    def add_transitions_to_memory(self, states, actions, rewards, next_states, dones):
+        self.wait_to_insert(len(actions))
+        self.replay_memory.add_batch(states, actions, rewards, next_states, dones)
+        if self.trajectory_writer is not None:
+            self.trajectory_writer.add_batch(states, actions, rewards, next_states, dones)
+        self.rate_limiter.inserted(len(actions))
+        self.instrumentation.count('actor_steps', len(actions))
 
     def predict(self, state):
-        return self.model.predict(np.array(state).reshape(-1, *state.shape))[0]
+        model = self.q_cache if self.q_cache is not None else self.model
+        return model.predict(np.array(state).reshape(-1, *state.shape))[0]
 
-    def train(self):
-        while len(self.replay_memory) < self.batch_size:
-            continue
-        for counter in tqdm(range(1, 1001)):
-            mini_batch = np.array(random.sample(self.replay_memory, self.batch_size), dtype=object)
+    def predict_batch(self, states):
+        model = self.q_cache if self.q_cache is not None else self.model
+        return model.predict(states, batch_size=len(states))
+
+    def compile_train_step(self, double_dqn=False):
+        # TensorFlow is only imported when the fused step is used
+        from learner_step import build_train_step
+        self.fused_train_step = build_train_step(self.model, self.target_model, self.gamma, double_dqn)
+
+    def train_step(self):
+        instrumentation = self.instrumentation
+        weights = None
+        with instrumentation.phase('wait_for_data'):
+            self.rate_limiter.wait_to_sample(self.batch_size)
+        with instrumentation.phase('sample'):
+            if self.prioritized_replay:
+                states, actions, rewards, next_states, dones, indices, weights = \
+                    self.replay_memory.sample(self.batch_size)
+            else:
+                states, actions, rewards, next_states, dones = self.replay_memory.sample(self.batch_size)
+        self.rate_limiter.sampled(self.batch_size)
+
+        if self.fused_train_step is not None:
+            with instrumentation.phase('fused_step'):
+                next_legal_masks = legal_masks_from_states(next_states)
+                if weights is None:
+                    weights = np.ones(self.batch_size, dtype=np.float32)
+                td_errors = self.fused_train_step(states, actions, rewards, next_states, dones, next_legal_masks,
+                                                  weights).numpy()
+        else:
+            td_errors = self.fit_step(states, actions, rewards, next_states, dones, weights)
+
+        if self.prioritized_replay:
+            with instrumentation.phase('priorities'):
+                self.replay_memory.update_priorities(indices, td_errors)
+        instrumentation.count('learner_updates')
+        instrumentation.count('samples_consumed', self.batch_size)
 
-            states = np.array(list(mini_batch[:, 0]))
+    def fit_step(self, states, actions, rewards, next_states, dones, weights):
+        instrumentation = self.instrumentation
+        with instrumentation.phase('predict'):
+            q_values = self.model.predict(states, batch_size=self.batch_size)
 
-            q_values = self.model.predict(states)
+        with instrumentation.phase('predict_next'):
+            max_future_q = np.max(self.model.predict(next_states, batch_size=self.batch_size), axis=1)
 
-            max_future_q = np.max(self.model.predict(np.array(list(mini_batch[:, 3]))), axis=1)
+        with instrumentation.phase('targets'):
+            # transition: state, action, reward, new_state, done
+            batch = np.arange(self.batch_size)
+            targets = rewards + self.gamma * max_future_q * ~dones
+            td_errors = targets - q_values[batch, actions]
+            q_values[batch, actions] = targets
 
-            for i in range(len(mini_batch)):
-                # transition: state, action, reward, new_state, done
-                action, reward, done = mini_batch[i, 1], mini_batch[i, 2], mini_batch[i, 4]
-                q_values[i, action] = reward
-                if not done:
-                    q_values[i, action] += self.gamma * max_future_q[i]
+        with instrumentation.phase('fit'):
+            self.target_model.fit(x=states, y=q_values, batch_size=self.batch_size, sample_weight=weights, verbose=0)
+        return td_errors
 
-            self.target_model.fit(x=states, y=q_values, batch_size=self.batch_size, verbose=0)
+    def record_gauges(self):
+        counters = self.instrumentation.counters
+        self.instrumentation.gauge('replay_fill', len(self.replay_memory) / self.replay_memory.capacity)
+        self.instrumentation.gauge('epsilon', self.epsilon)
+        if self.q_cache is not None:
+            self.instrumentation.gauge('q_cache_hit_rate', self.q_cache.hit_rate)
+        # Learner samples consumed per transition produced by the actors
+        self.instrumentation.gauge('replay_ratio',
+                                   counters.get('samples_consumed', 0) / max(counters.get('actor_steps', 0), 1))
+
+    def snapshot(self, include_replay=False):
+        with self.instrumentation.lock:
+            counters = dict(self.instrumentation.counters)
+        return {'iteration': self.iteration, 'epsilon': self.epsilon, 'counters': counters,
+                'model': self.model.get_weights(), 'target_model': self.target_model.get_weights(),
+                'optimizer': get_optimizer_weights(self.target_model),
+                'replay': self.replay_memory.snapshot() if include_replay else None}
+
+    def restore(self, snapshot):
+        self.iteration = snapshot['iteration']
+        self.epsilon = snapshot['epsilon']
+        self.instrumentation.counters.update(snapshot['counters'])
+        self.model.set_weights(snapshot['model'])
+        self.target_model.set_weights(snapshot['target_model'])
+        if snapshot['optimizer']:
+            set_optimizer_weights(self.target_model, snapshot['optimizer'])
+        if snapshot.get('replay') is not None:
+            self.replay_memory.restore(snapshot['replay'])
+            self.rate_limiter.inserted(len(self.replay_memory))
+        self.initialized = self.iteration >= self.model_update_frequency
+
+    def save_checkpoint(self, block=False):
+        # The snapshot, a copy of replay memory with checkpoint_replay, is only taken if it would be written
+        if not block and not self.checkpointer.ready():
+            self.instrumentation.count('checkpoints_skipped')
+            return
+        with self.instrumentation.phase('checkpoint'):
+            saved = self.checkpointer.save(self.snapshot(self.checkpoint_replay), block)
+        self.instrumentation.count('checkpoints' if saved else 'checkpoints_skipped')
+
+    def train(self):
+        for _ in tqdm(range(self.iteration, self.iterations)):
+            self.train_step()
+            self.iteration += 1
+            counter = self.iteration
 
             if counter % self.model_update_frequency == 0:
-                self.model.set_weights(self.target_model.get_weights())
+                with self.instrumentation.phase('set_weights'):
+                    weights = self.target_model.get_weights()
+                    self.model.set_weights(weights)
+                    for callback in self.weight_sync_callbacks:
+                        callback(weights)
                 if not self.initialized:
                     self.initialized = True
+            if self.checkpointer is not None and counter % self.checkpoint_interval == 0:
+                self.save_checkpoint()
+            self.record_gauges()
+            self.instrumentation.tick()
 
         self.training = False
+        # Releases actors waiting for the learner
+        self.rate_limiter.close()
+        if self.checkpointer is not None:
+            self.save_checkpoint(block=True)
+            self.checkpointer.close()
+        if self.trajectory_writer is not None:
+            self.trajectory_writer.close()
+        self.instrumentation.write(self.instrumentation.snapshot())
         print("Saving")
         folder = f'models/{utils.get_timestamp()}'
         if not os.path.exists(folder):
             os.makedirs(folder)
         self.model.save(f'{folder}/model.h5')
+        export_model(self.model, f'{folder}/model.npz')
 
 
-def run(agent):
-    env = UnoEnvironment(2)
+def run_vectorized(agent, number_of_games=256, inference=None, recorder=None, seed=None):
+    env_seed, rng_seed = spawn_seeds(seed, 2)
+    env = VecUnoEnvironment(number_of_games, seed=env_seed, recorder=recorder)
+    rng = np.random.default_rng(rng_seed)
+    states, legal_masks = env.reset()
 
     while agent.training:
-        done = False
-        state = None
-        rewards = []
-
-        while not done:
-            legal_actions = env.get_legal_actions()
-            if state is None or np.random.sample() < agent.epsilon or not agent.initialized:
-                # Choose a random legal action
-                action = np.random.choice(legal_actions, 1)
-            else:
-                # Choose a legal action from the policy
-                max_index = 0
-                values = agent.predict(state)
-                for index, action in enumerate(legal_actions):
-                    if values[action] > values[max_index]:
-                        max_index = index
-                action = legal_actions[max_index]
-
-            new_state, reward, done, _ = env.step(action)
-            rewards.append(reward)
+        # Random legal action for every game, replaced by the policy where it explores less
+        actions = masked_sample(legal_masks, rng)
+        if agent.initialized and inference is not None:
+            _, actions = inference.act(states, legal_masks, agent.epsilon, rng)
+        elif agent.initialized:
+            greedy = rng.random(number_of_games) >= agent.epsilon
+            if greedy.any():
+                actions[greedy] = masked_argmax(agent.predict_batch(states[greedy]), legal_masks[greedy])
 
-            if state is not None:
-                agent.add_transition_to_memory((state, action, reward, new_state, done))
-            state = new_state
+        new_states, rewards, dones, legal_masks = env.step(actions)
+        agent.add_transitions_to_memory(states, actions, rewards, new_states, dones)
+        states = new_states
 
-            if agent.initialized:
-                if agent.epsilon > agent.epsilon_min:
-                    agent.epsilon *= agent.epsilon_decay
-        env.reset()
+        if agent.initialized:
+            if agent.epsilon > agent.epsilon_min:
+                agent.epsilon *= agent.epsilon_decay ** number_of_games
 
 
 if __name__ == '__main__':
-    agent = DQNAgent(UnoEnvironment.STATE_SIZE, UnoEnvironment.ACTION_COUNT)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--actors', type=int, default=0,
+                        help='number of self-play actor processes, 0 plays in a thread of the learner')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='number of self-play actor threads sharing batched inference, without --actors')
+    parser.add_argument('--games', type=int, default=64, help='games stepped together by every actor')
+    parser.add_argument('--prioritized', action='store_true',
+                        help='sample replay memory by TD error priority instead of uniformly')
+    parser.add_argument('--replay-size', type=int, default=10000, help='transitions kept in replay memory')
+    parser.add_argument('--packed-replay', action='store_true', help='store replay memory states as bits')
+    parser.add_argument('--share-next-states', action='store_true',
+                        help='read next states from the following transitions instead of storing them, '
+                             'needs a single actor thread and no --actors')
+    parser.add_argument('--fused', action='store_true',
+                        help='run every learner update as one compiled TensorFlow call, next states are valued '
+                             'over their legal actions only')
+    parser.add_argument('--double-dqn', action='store_true', help='Double DQN targets, needs --fused')
+    parser.add_argument('--replay-ratio', type=float,
+                        help='learner samples per actor transition, the faster side waits for the other')
+    parser.add_argument('--q-cache', type=int, default=0,
+                        help='cache the Q-values of up to this many states for the self-play actors')
+    parser.add_argument('--record', help='append all self-play transitions to this trajectory directory')
+    parser.add_argument('--record-games', help='append every finished self-play game to this game record directory, '
+                                                   'without --actors')
+    parser.add_argument('--warm-start', help='fill replay memory from this trajectory directory before training')
+    parser.add_argument('--offline', help='train on this trajectory directory without self-play')
+    parser.add_argument('--checkpoints', help='write checkpoints of the training state to this directory')
+    parser.add_argument('--checkpoint-interval', type=int, default=100, help='learner iterations between checkpoints')
+    parser.add_argument('--checkpoint-replay', action='store_true', help='include replay memory in checkpoints')
+    parser.add_argument('--resume', action='store_true', help='resume from the latest checkpoint in --checkpoints')
+    parser.add_argument('--metrics', help='append JSON lines snapshots of the training phase timers to this file')
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help='seconds between metrics snapshots')
+    parser.add_argument('--evaluate', help='evaluate every weight sync against the random agent in a background '
+                                           'process and append the results to this file')
+    parser.add_argument('--evaluation-games', type=int, default=1000, help='games played by every evaluation')
+    parser.add_argument('--evaluation-cpu', type=float, default=0.5,
+                        help='CPU cores the background evaluation may use on average')
+    parser.add_argument('--seed', type=int,
+                        help='master seed of the network, replay memory and every actor, a fresh one is printed '
+                             'by default')
+    args = parser.parse_args()
+    if args.share_next_states and (args.actors > 0 or args.threads != 1):
+        parser.error('--share-next-states needs transitions from a single actor thread')
+    if args.share_next_states and args.games >= args.replay_size:
+        parser.error('--share-next-states needs a --replay-size larger than --games')
+    if args.share_next_states and args.warm_start:
+        parser.error('--warm-start loads transitions out of game order, it can not be combined with '
+                     '--share-next-states')
+    if args.double_dqn and not args.fused:
+        parser.error('--double-dqn needs --fused')
+    if args.record_games and args.actors > 0:
+        parser.error('--record-games needs self-play in actor threads')
+    if args.resume and not args.checkpoints:
+        parser.error('--resume needs --checkpoints')
+    if args.offline and args.prioritized:
+        parser.error('--offline samples the trajectory store uniformly, it can not be combined with --prioritized')
+    if args.offline and args.checkpoint_replay:
+        parser.error('--offline trains on the trajectory store without a replay memory, it can not be combined '
+                     'with --checkpoint-replay')
+
+    # Learner and actors get independent streams spawned from one master seed, any actor count reproduces
+    # the streams of the first actors
+    seed_sequence = np.random.SeedSequence(args.seed)
+    print("Seed: " + str(seed_sequence.entropy))
+    learner_seed, actors_seed, store_seed = seed_sequence.spawn(3)
+    # Keras initializes the network from the TensorFlow global seed
+    import tensorflow as tf
+    tf.random.set_seed(int(learner_seed.generate_state(1)[0]))
+    agent = DQNAgent(UnoEnvironment.STATE_SIZE, UnoEnvironment.ACTION_COUNT, args.prioritized, args.replay_size,
+                     args.packed_replay, args.games if args.share_next_states else None, learner_seed)
+    agent.instrumentation = Instrumentation(args.metrics, args.metrics_interval)
+    if args.fused:
+        agent.compile_train_step(args.double_dqn)
+    if args.replay_ratio:
+        agent.rate_limiter = RateLimiter(agent.min_replay_size, args.replay_ratio, tolerance=args.replay_size // 10)
+    if args.record:
+        agent.trajectory_writer = TrajectoryWriter(args.record, agent.state_size)
+    if args.warm_start:
+        agent.rate_limiter.inserted(TrajectoryReader(args.warm_start, store_seed).load_into(agent.replay_memory))
+    if args.checkpoints:
+        agent.checkpointer = Checkpointer(args.checkpoints)
+        agent.checkpoint_interval = args.checkpoint_interval
+        agent.checkpoint_replay = args.checkpoint_replay
+        snapshot = agent.checkpointer.load_latest() if args.resume else None
+        if snapshot is not None:
+            agent.restore(snapshot)
+            print("Resuming from iteration " + str(agent.iteration))
+
+    evaluator = None
+    if args.evaluate:
+        evaluator = BackgroundEvaluator(args.evaluate, agent, args.evaluation_games,
+                                        cpu_budget=args.evaluation_cpu).start()
+        agent.weight_sync_callbacks.append(evaluator.publish_weights)
 
-    for thread in range(3):
-        threading.Thread(target=run, args=(agent,), daemon=True).start()
-    agent.train()
+    if args.offline:
+        # Sampled straight from the memory mapped store, the agent still trains its models as usual
+        agent.replay_memory = TrajectoryReader(args.offline, store_seed)
+        agent.rate_limiter = RateLimiter(0)
+        agent.train()
+    elif args.actors > 0:
+        actors = ActorPool(agent, args.actors, args.games, seed=actors_seed)
+        agent.weight_sync_callbacks.append(actors.publish_weights)
+        actors.start()
+        agent.train()
+        actors.stop()
+    else:
+        # Actor threads are served by a NumPy copy of the model, kept in sync with every weight update
+        policy = NumpyModel(agent.model.get_weights())
+        if args.q_cache:
+            # set_weights of the cache also invalidates it, its hit rate is reported with the gauges
+            policy = agent.q_cache = CachedModel(policy, args.q_cache)
+        agent.weight_sync_callbacks.append(policy.set_weights)
+        inference = InferenceService(policy.predict).start()
+        # One recorder is shared by all actor threads
+        recorder = GameRecorder(args.record_games) if args.record_games else None
+        for thread_seed in spawn_seeds(actors_seed, args.threads):
+            threading.Thread(target=run_vectorized, args=(agent, args.games, inference, recorder, thread_seed),
+                             daemon=True).start()
+        agent.train()
+        inference.stop()
+        if recorder is not None:
+            recorder.close()
+    if evaluator is not None:
+        evaluator.stop()
@@ -0,0 +1,81 @@
+import os
+import sys
+import numpy as np
+
+
+class NumpyModel:
+    """
+        Forward pass of the Dense Q-network in plain NumPy. weights is the list
+        returned by Keras get_weights, kernel and bias of every layer in turn.
+        Hidden layers use relu and the output layer is linear unless
+        activations says otherwise.
+    """
+    def __init__(self, weights, activations=None):
+        self.activations = list(activations) if activations is not None \
+            else ['relu'] * (len(weights) // 2 - 1) + ['linear']
+        self.layers = []
+        self.set_weights(weights)
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as data:
+            layers = len(data['activations'])
+            weights = []
+            for layer in range(layers):
+                weights += [data[f'kernel_{layer}'], data[f'bias_{layer}']]
+            return NumpyModel(weights, data['activations'].tolist())
+
+    def save(self, path):
+        arrays = {'activations': np.array(self.activations)}
+        for layer, (kernel, bias, _) in enumerate(self.layers):
+            arrays[f'kernel_{layer}'] = kernel
+            arrays[f'bias_{layer}'] = bias
+        np.savez(path, **arrays)
+
+    def get_weights(self):
+        return [weight for kernel, bias, _ in self.layers for weight in (kernel, bias)]
+
+    def set_weights(self, weights):
+        # Replaced in one assignment, so a concurrent predict sees either the old or the new weights
+        self.layers = [(np.array(kernel, dtype=np.float32), np.array(bias, dtype=np.float32), activation)
+                       for kernel, bias, activation in zip(weights[0::2], weights[1::2], self.activations)]
+
+    def predict(self, states, batch_size=None, verbose=0):
+        # Same call signature as Keras Model.predict, batch_size and verbose are ignored
+        values = np.asarray(states, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            values = values @ kernel
+            values += bias
+            if activation == 'relu':
+                np.maximum(values, 0, out=values)
+        return values
+
+
+def layer_activations(keras_model):
+    return [layer.get_config()['activation'] for layer in keras_model.layers]
+
+
+def export_model(keras_model, path):
+    model = NumpyModel(keras_model.get_weights(), layer_activations(keras_model))
+    model.save(path)
+    return model
+
+
+def load_model(path):
+    # .npz files load without Keras, for a Keras .h5 file an exported model.npz next to it is used if present
+    exported = os.path.splitext(path)[0] + '.npz'
+    if os.path.exists(exported):
+        return NumpyModel.load(exported)
+    from keras.models import load_model as load_keras_model
+    keras_model = load_keras_model(path)
+    return NumpyModel(keras_model.get_weights(), layer_activations(keras_model))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Please provide path to model")
+    else:
+        from keras.models import load_model as load_keras_model
+        export_path = os.path.splitext(sys.argv[1])[0] + '.npz'
+        export_model(load_keras_model(sys.argv[1]), export_path)
+        print("Exported to " + export_path)
@@ -1,7 +1,11 @@
 import sys
 from game import UnoGame
+from game_record import GameRecorder
 
-if len(sys.argv) != 2:
-    print("Please provide path to model")
+if len(sys.argv) not in (2, 3):
+    print("Please provide path to model, and optionally a directory to record the game to")
 else:
-    game = UnoGame(sys.argv[1], 2)
+    recorder = GameRecorder(sys.argv[2]) if len(sys.argv) == 3 else None
+    game = UnoGame(sys.argv[1], 2, recorder)
+    if recorder is not None:
+        recorder.close()
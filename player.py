@@ -1,23 +1,41 @@
+import numpy as np
 from card import Card
 
 
 class Player:
     def __init__(self, cards):
-        self.cards = cards
+        # Number of held copies of every card kind, indexed by action number
+        self.hand = np.zeros(54, dtype=np.int8)
+        self.hand_size = 0
+        self.add_cards(cards)
+
+    def copy(self):
+        player = Player(())
+        player.hand[...] = self.hand
+        player.hand_size = self.hand_size
+        return player
+
+    @property
+    def cards(self):
+        return [Card.from_action(action) for action in np.repeat(np.arange(54), self.hand)]
 
     def print_hand(self):
         Card.pretty_print_cards(self.cards, True)
 
-    def play_card(self, index):
-        card_to_play = self.cards[index]
-        del self.cards[index]
-        return card_to_play
+    def has_card(self, action):
+        return self.hand[action] > 0
+
+    def play_card(self, action):
+        if self.hand[action] <= 0:
+            raise ValueError("Card " + str(action) + " is not in hand")
+        self.hand[action] -= 1
+        self.hand_size -= 1
+        return action
 
     def add_cards(self, cards):
-        self.cards += cards
+        for card in cards:
+            self.hand[card] += 1
+        self.hand_size += len(cards)
 
     def get_hand_size(self):
-        return len(self.cards)
-
-    def get_drawn_card(self):
-        return self.cards(self.get_hand_size()-1)
+        return self.hand_size
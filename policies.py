@@ -0,0 +1,63 @@
+import numpy as np
+from card import ACTION_TRAIT, DRAW_ACTION, SKIP, REVERSE, DRAW_2, WILD, DRAW_4
+from rules import masked_argmax, masked_sample
+
+
+def random_agent_actions(legal_masks, rng):
+    # Random agent of UnoTest for every row of legal_masks, it only draws when no card can be played
+    legal_masks = legal_masks.copy()
+    legal_masks[:, DRAW_ACTION] = ~legal_masks[:, :DRAW_ACTION].any(axis=1)
+    return masked_sample(legal_masks, rng)
+
+
+def model_actions(model, states, legal_masks):
+    # Greedy legal actions of a Q-network, model is a Keras or NumpyModel, with one batched prediction
+    return masked_argmax(model.predict(states, batch_size=len(states)), legal_masks)
+
+
+class RandomPolicy:
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def act(self, game):
+        return random_agent_actions(game.get_legal_mask()[None], self.rng)[0]
+
+
+class ModelPolicy:
+    def __init__(self, model):
+        self.model = model
+
+    def act(self, game):
+        return model_actions(self.model, game.get_state().reshape(1, -1), game.get_legal_mask()[None])[0]
+
+
+class HeuristicPolicy:
+    # Plays cards that hurt the opponent first, higher numbers before lower ones and wild cards last
+    PRIORITY = np.zeros(DRAW_ACTION + 1)
+    PRIORITY[:DRAW_ACTION] = ACTION_TRAIT
+    PRIORITY[:DRAW_ACTION][ACTION_TRAIT == DRAW_2] = 14
+    PRIORITY[:DRAW_ACTION][ACTION_TRAIT == SKIP] = 13
+    PRIORITY[:DRAW_ACTION][ACTION_TRAIT == REVERSE] = 12
+    PRIORITY[:DRAW_ACTION][ACTION_TRAIT == WILD] = -1
+    PRIORITY[:DRAW_ACTION][ACTION_TRAIT == DRAW_4] = -2
+    PRIORITY[DRAW_ACTION] = -3
+
+    def act(self, game):
+        return masked_argmax(self.PRIORITY, game.get_legal_mask())
+
+
+class HumanPolicy:
+    # Reads moves from the terminal, 0 draws and n plays the n-th card of the printed hand
+    def act(self, game):
+        game.pretty_print_state()
+        player = game.players[game.current_player]
+
+        while True:
+            action_input = int(input("Get action:"))
+            if 0 <= action_input <= player.get_hand_size():
+                if action_input == 0:
+                    return DRAW_ACTION
+                action = player.cards[action_input - 1].action_number
+                if game.get_legal_mask()[action]:
+                    return action
+            print("You can't do that")
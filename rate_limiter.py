@@ -0,0 +1,71 @@
+import threading
+
+
+class RateLimiter:
+    """
+        Paces the learner against the actors. Sampling blocks until
+        min_size transitions were inserted. With a replay_ratio, the number
+        of learner samples per inserted transition, sampling also blocks
+        when the learner is ahead of that ratio and inserting blocks when
+        the actors are ahead of it, each by more than tolerance transitions.
+        Both sides wait on a condition variable instead of polling.
+    """
+    def __init__(self, min_size, replay_ratio=None, tolerance=1000):
+        self.min_size = min_size
+        self.replay_ratio = replay_ratio
+        self.tolerance = tolerance
+        self.condition = threading.Condition()
+        self.inserts = 0
+        self.samples = 0
+        self.largest_insert = 0
+        self.largest_sample = 0
+        self.closed = False
+
+    def slack(self):
+        # Smaller slack than one insert plus one sample could leave both sides waiting for each other
+        return max(self.tolerance, self.largest_insert + self.largest_sample / self.replay_ratio)
+
+    def ahead(self):
+        # Transitions inserted beyond what the learner sampled at replay_ratio
+        return self.inserts - self.min_size - self.samples / self.replay_ratio
+
+    def can_insert(self, count):
+        return self.replay_ratio is None or self.inserts < self.min_size or self.ahead() + count <= self.slack()
+
+    def can_sample(self, count):
+        if self.inserts < self.min_size:
+            return False
+        return self.replay_ratio is None or self.ahead() - count / self.replay_ratio >= -self.slack()
+
+    def wait_to_insert(self, count, timeout=None):
+        # Returns False if the limiter was closed or timeout passed while waiting
+        with self.condition:
+            if count > self.largest_insert:
+                # A larger slack can release the learner
+                self.largest_insert = count
+                self.condition.notify_all()
+            return self.condition.wait_for(lambda: self.closed or self.can_insert(count), timeout) \
+                and not self.closed
+
+    def wait_to_sample(self, count, timeout=None):
+        with self.condition:
+            if count > self.largest_sample:
+                self.largest_sample = count
+                self.condition.notify_all()
+            return self.condition.wait_for(lambda: self.closed or self.can_sample(count), timeout) \
+                and not self.closed
+
+    def inserted(self, count):
+        with self.condition:
+            self.inserts += count
+            self.condition.notify_all()
+
+    def sampled(self, count):
+        with self.condition:
+            self.samples += count
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
@@ -0,0 +1,250 @@
+import threading
+import numpy as np
+
+
+class ReplayMemory:
+    """
+        Fixed capacity ring buffer of transitions (state, action, reward, next_state, done)
+        stored in typed arrays. Oldest transitions are overwritten once it is full.
+        With packed the binary states are stored as bits, 57 bytes for a UNO
+        state, and unpacked when sampled. With next_state_offset next states
+        are not stored at all, the next state of a transition is the state
+        next_state_offset slots later. This only holds when a single producer
+        adds the transitions of its games in order, like one run_vectorized
+        stepping that many games.
+    """
+    def __init__(self, capacity, state_size, seed=None, packed=False, next_state_offset=None):
+        self.capacity = capacity
+        self.state_size = state_size
+        self.packed = packed
+        self.next_state_offset = next_state_offset
+        self.rng = np.random.default_rng(seed)
+        stored_size = -(-state_size // 8) if packed else state_size
+        self.states = np.zeros((capacity, stored_size), dtype=np.uint8)
+        self.actions = np.zeros(capacity, dtype=np.int16)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, stored_size), dtype=np.uint8) if next_state_offset is None else None
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.position = 0
+        self.size = 0
+        self.lock = threading.RLock()
+        self.batch = None
+
+    def __len__(self):
+        return self.size
+
+    def encode(self, states):
+        return np.packbits(states, axis=-1) if self.packed else states
+
+    def add(self, state, action, reward, next_state, done):
+        with self.lock:
+            position = self.position
+            self.states[position] = self.encode(state)
+            self.actions[position] = action
+            self.rewards[position] = reward
+            if self.next_states is not None:
+                self.next_states[position] = self.encode(next_state)
+            self.dones[position] = done
+            self.position = (position + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+        return position
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        count = len(actions)
+        with self.lock:
+            positions = (self.position + np.arange(count)) % self.capacity
+            self.states[positions] = self.encode(states)
+            self.actions[positions] = actions
+            self.rewards[positions] = rewards
+            if self.next_states is not None:
+                self.next_states[positions] = self.encode(next_states)
+            self.dones[positions] = dones
+            self.position = (self.position + count) % self.capacity
+            self.size = min(self.size + count, self.capacity)
+        return positions
+
+    def batch_arrays(self, batch_size):
+        # Batch arrays are reused by the next call to sample
+        if self.batch is None or len(self.batch[1]) != batch_size:
+            self.batch = (np.empty((batch_size, self.state_size), dtype=np.uint8),
+                          np.empty(batch_size, dtype=np.int16),
+                          np.empty(batch_size, dtype=np.float32),
+                          np.empty((batch_size, self.state_size), dtype=np.uint8),
+                          np.empty(batch_size, dtype=bool))
+        return self.batch
+
+    def take_states(self, source, indices, out):
+        if self.packed:
+            out[...] = np.unpackbits(source[indices], axis=1, count=self.state_size)
+        else:
+            np.take(source, indices, axis=0, out=out)
+
+    def gather(self, indices):
+        states, actions, rewards, next_states, dones = self.batch_arrays(len(indices))
+        self.take_states(self.states, indices, states)
+        np.take(self.actions, indices, out=actions)
+        np.take(self.rewards, indices, out=rewards)
+        if self.next_states is None:
+            self.take_states(self.states, (indices + self.next_state_offset) % self.capacity, next_states)
+        else:
+            self.take_states(self.next_states, indices, next_states)
+        np.take(self.dones, indices, out=dones)
+        return self.batch
+
+    def snapshot(self):
+        with self.lock:
+            snapshot = {'states': self.states.copy(), 'actions': self.actions.copy(), 'rewards': self.rewards.copy(),
+                        'dones': self.dones.copy(), 'position': self.position, 'size': self.size}
+            if self.next_states is not None:
+                snapshot['next_states'] = self.next_states.copy()
+        return snapshot
+
+    def restore(self, snapshot):
+        if snapshot['states'].shape != self.states.shape:
+            raise ValueError("Replay snapshot of shape " + str(snapshot['states'].shape) +
+                             " does not fit memory of shape " + str(self.states.shape))
+        with self.lock:
+            self.states[...] = snapshot['states']
+            self.actions[...] = snapshot['actions']
+            self.rewards[...] = snapshot['rewards']
+            self.dones[...] = snapshot['dones']
+            if self.next_states is not None:
+                self.next_states[...] = snapshot['next_states']
+            self.position = int(snapshot['position'])
+            self.size = int(snapshot['size'])
+
+    def sampleable(self):
+        # Counted from the oldest slot, the newest next_state_offset slots have no next state yet
+        count = self.size - (self.next_state_offset or 0)
+        if count <= 0:
+            raise ValueError("No transition with a next state to sample yet, " + str(self.size) +
+                             " transitions are stored")
+        return count
+
+    def sample(self, batch_size):
+        with self.lock:
+            count = self.sampleable()
+            indices = (self.position - self.size + self.rng.integers(count, size=batch_size)) % self.capacity
+            return self.gather(indices)
+
+
+class SumTree:
+    """
+        Binary tree over capacity leaf priorities where every node holds the
+        sum of its children, stored as an array with the root at index 1.
+        Updates and prefix sum lookups take O(log n) and work on whole batches.
+    """
+    def __init__(self, capacity):
+        self.leaves = 1 << max(int(capacity) - 1, 1).bit_length()
+        self.tree = np.zeros(2 * self.leaves, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def __getitem__(self, indices):
+        return self.tree[self.leaves + np.asarray(indices)]
+
+    def update(self, indices, priorities):
+        nodes = self.leaves + np.asarray(indices)
+        self.tree[nodes] = priorities
+        # Parents are recomputed from their children level by level, so sums do not drift
+        nodes = np.unique(nodes // 2)
+        while True:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        # Leaf index of every value, the first leaf whose prefix sum of priorities exceeds it
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.leaves:
+            nodes *= 2
+            left = self.tree[nodes]
+            right = values >= left
+            values -= left * right
+            nodes += right
+        return nodes - self.leaves
+
+
+class PrioritizedReplayMemory(ReplayMemory):
+    """
+        Replay memory sampling transitions in proportion to priority ** alpha,
+        the priority being the absolute TD error of the transition. New
+        transitions get the highest priority seen so far. sample also returns
+        the indices of the batch, for update_priorities, and its importance
+        sampling weights with beta annealed towards 1 by every call.
+    """
+    def __init__(self, capacity, state_size, alpha=0.6, beta=0.4, beta_increment=0.0006, epsilon=0.01, seed=None,
+                 packed=False, next_state_offset=None):
+        super().__init__(capacity, state_size, seed, packed, next_state_offset)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0
+
+    def add(self, state, action, reward, next_state, done):
+        with self.lock:
+            position = super().add(state, action, reward, next_state, done)
+            self.update_added(np.array([position]))
+        return position
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        with self.lock:
+            positions = super().add_batch(states, actions, rewards, next_states, dones)
+            self.update_added(positions)
+        return positions
+
+    def update_added(self, positions):
+        if self.next_state_offset is None:
+            self.tree.update(positions, self.max_priority)
+            return
+        # Added slots can not be sampled before their next state is added, the slots it completes can
+        self.tree.update(positions, 0.0)
+        ages = self.size - len(positions) - self.next_state_offset + np.arange(len(positions))
+        completed = (positions - self.next_state_offset)[ages >= 0] % self.capacity
+        if len(completed):
+            self.tree.update(completed, self.max_priority)
+
+    def snapshot(self):
+        with self.lock:
+            snapshot = super().snapshot()
+            snapshot.update({'tree': self.tree.tree.copy(), 'max_priority': self.max_priority, 'beta': self.beta})
+        return snapshot
+
+    def restore(self, snapshot):
+        with self.lock:
+            super().restore(snapshot)
+            self.tree.tree[...] = snapshot['tree']
+            self.max_priority = float(snapshot['max_priority'])
+            self.beta = float(snapshot['beta'])
+
+    def sample(self, batch_size):
+        with self.lock:
+            self.sampleable()
+            # One value from each of batch_size equal segments of the total priority
+            segment = self.tree.total / batch_size
+            values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+            indices = np.minimum(self.tree.find(values), self.size - 1)
+            probabilities = self.tree[indices] / self.tree.total
+            batch = self.gather(indices)
+        weights = (self.size * probabilities) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return batch + (indices, weights.astype(np.float32))
+
+    def update_priorities(self, indices, td_errors):
+        # A slot overwritten since it was sampled gets the priority of the transition it held before
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        with self.lock:
+            if self.next_state_offset is not None:
+                # A slot overwritten since has no next state yet, it stays unsampleable until update_added
+                # completes it
+                ages = (self.position - 1 - indices) % self.capacity
+                priorities = np.where(ages < self.next_state_offset, 0.0, priorities)
+            self.tree.update(indices, priorities)
+            self.max_priority = max(self.max_priority, float(priorities.max()))
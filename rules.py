@@ -0,0 +1,62 @@
+import numpy as np
+from card import ACTION_CELL, ACTION_COLOR, ACTION_TRAIT, DRAW_ACTION, DRAW_4_ACTION, WILD, WILD_ACTION
+from utils import COLORS
+
+ACTION_COUNT = 55
+
+# COMPATIBLE[top, card] is True if card can be played on a colored top card
+COMPATIBLE = (ACTION_COLOR[:, None] == ACTION_COLOR[None, :]) | (ACTION_TRAIT[:, None] == ACTION_TRAIT[None, :])
+COMPATIBLE[:, WILD_ACTION] = True
+# draw_4 is only legal when nothing else is, see legal_mask
+COMPATIBLE[:, DRAW_4_ACTION] = False
+
+# Color override rows used instead when the top card is wild and a color was chosen
+COLOR_COMPATIBLE = np.arange(COLORS)[:, None] == ACTION_COLOR[None, :]
+COLOR_COMPATIBLE[:, WILD_ACTION] = True
+
+# Compatible row of the top card encoded at every cell of the top card plane of a state
+TOP_CELL_COMPATIBLE = np.zeros((5 * 15, DRAW_ACTION), dtype=bool)
+for cell in range(COLORS * 15):
+    color, trait = divmod(cell, 15)
+    TOP_CELL_COMPATIBLE[cell] = COLOR_COMPATIBLE[color] if trait >= WILD else COMPATIBLE[color * 13 + trait]
+
+
+def legal_mask(hand, top, top_color):
+    mask = np.zeros(ACTION_COUNT, dtype=bool)
+    compatible = COLOR_COMPATIBLE[top_color] if top >= WILD_ACTION else COMPATIBLE[top]
+    np.logical_and(hand > 0, compatible, out=mask[:DRAW_ACTION])
+    # Only if there are no other legal actions except draw, draw_4 is legal
+    if hand[DRAW_4_ACTION] > 0 and not mask.any():
+        mask[DRAW_4_ACTION] = True
+    mask[DRAW_ACTION] = True
+    return mask
+
+
+def legal_masks(hands, tops, top_colors):
+    tops = np.asarray(tops, dtype=np.int64)
+    compatible = np.where((tops >= WILD_ACTION)[:, None], COLOR_COMPATIBLE[top_colors], COMPATIBLE[tops])
+    return compatible_masks(hands > 0, compatible)
+
+
+def legal_masks_from_states(states):
+    # Legal actions of the players the states were encoded for, read from their hand and top card planes
+    planes = np.asarray(states).reshape(len(states), 6, 5 * 15)
+    in_hand = planes[:, :4, ACTION_CELL].any(axis=1)
+    return compatible_masks(in_hand, TOP_CELL_COMPATIBLE[np.argmax(planes[:, 4], axis=1)])
+
+
+def compatible_masks(in_hand, compatible):
+    masks = np.zeros((len(in_hand), ACTION_COUNT), dtype=bool)
+    np.logical_and(in_hand, compatible, out=masks[:, :DRAW_ACTION])
+    masks[:, DRAW_4_ACTION] = in_hand[:, DRAW_4_ACTION] & ~masks.any(axis=1)
+    masks[:, DRAW_ACTION] = True
+    return masks
+
+
+def masked_argmax(values, mask):
+    return np.argmax(np.where(mask, values, -np.inf), axis=-1)
+
+
+def masked_sample(mask, rng=np.random):
+    # Uniform over the legal actions of every row of mask
+    return np.argmax(rng.random(np.shape(mask)) * mask, axis=-1)
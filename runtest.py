@@ -1,35 +1,21 @@
 import sys
-import time
 
-from tqdm import tqdm
+from numpy_model import load_model
 
-from test import UnoTest
+from evaluate import Evaluator
+from game_record import GameRecorder
 
-if len(sys.argv) != 2:
-    print("Please provide path to model")
+if len(sys.argv) not in (2, 3):
+    print("Please provide path to model, and optionally a directory to record the games to")
 else:
-    agent_wins = 0
     games = 1000
-    for counter in tqdm(range(games)):
-        game = UnoTest(sys.argv[1], 2)
-        finished = False
-        agent_random = None
-        agent_tested = None
-        while not finished:
-
-            game.current_player = (game.current_player + game.turn_direction) % game.number_of_players
-
-            if game.current_player == 0:
-                agent_random = game.random_agent_move()
-            else:
-                agent_tested = game.agent_move()
-
-            if agent_random == 0:
-                finished = True
-            elif agent_tested == 1:
-                finished = True
-                agent_wins += 1
+    recorder = GameRecorder(sys.argv[2]) if len(sys.argv) == 3 else None
+    # Model is loaded once, all games are played concurrently with batched predictions
+    results = Evaluator(load_model(sys.argv[1]), recorder=recorder).evaluate(games)
+    if recorder is not None:
+        recorder.close()
     print("Games: " + str(games))
-    print("Agent wins: " + str(agent_wins))
-    print(agent_wins/games)
-
+    print("Agent wins: " + str(results['wins']))
+    print(results['win_rate'])
+    print("Mean game length: " + str(results['mean_game_length']))
+    print("Games per second: " + str(results['games_per_second']))
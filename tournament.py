@@ -0,0 +1,172 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from evaluate import model_policy, play_games, random_policy
+from numpy_model import load_model
+
+RANDOM = 'random'
+ELO_BASE = 1000
+
+
+def discover_models(directory):
+    # Every models/<timestamp> folder with a saved model, the exported .npz is preferred by load_model
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        for file_name in ('model.npz', 'model.h5'):
+            path = os.path.join(directory, name, file_name)
+            if os.path.exists(path):
+                paths.append(path)
+                break
+    return paths
+
+
+def fingerprint(path):
+    # Cache key of a player, changes when the model file is overwritten
+    if path == RANDOM:
+        return RANDOM
+    with open(path, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()[:16]
+
+
+def load_policy(path):
+    return random_policy if path == RANDOM else model_policy(load_model(path))
+
+
+def play_matchup(first, second, games, number_of_games, seed):
+    # Each player moves first in half of the games, returns the wins of first and second
+    policies = [load_policy(first), load_policy(second)]
+    first_wins, _ = play_games(policies, games // 2, number_of_games, 0, seed)
+    second_wins, _ = play_games(policies, games - games // 2, number_of_games, 1, seed + 1)
+    wins = first_wins + second_wins
+    return int(wins[0]), int(wins[1])
+
+
+def elo_ratings(wins, games):
+    """
+        Elo ratings fitted to the whole win matrix with the Bradley-Terry
+        model, so the ratings do not depend on the order the games were
+        played in. wins[i, j] is the number of games i won against j out of
+        games[i, j], games without a winner count half for both. Every pair
+        that played gets one more such draw, which keeps the ratings of
+        players without wins or losses finite. The first player is rated ELO_BASE.
+    """
+    played = games > 0
+    wins = wins + 0.5 * (games - wins - wins.T) + 0.5 * played
+    games = games + played
+    total_wins = wins.sum(axis=1)
+    strengths = np.ones(len(wins))
+    for _ in range(1000):
+        # Minorization-maximization update of Hunter (2004)
+        updated = total_wins / (games / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+        updated /= updated[0]
+        if np.allclose(updated, strengths, rtol=1e-9):
+            break
+        strengths = updated
+    return ELO_BASE + 400 * np.log10(strengths)
+
+
+class Tournament:
+    """
+        Round robin between the random agent of UnoTest and every model in
+        models, in both seat orders. Matchups run in a pool of processes,
+        each playing its games concurrently with batched predictions.
+        Results are cached in cache_path by the fingerprints of both players,
+        so only matchups of new or changed models are played.
+    """
+    def __init__(self, models, games=1000, number_of_games=512, workers=None, cache_path=None, seed=0):
+        self.players = [RANDOM] + list(models)
+        self.games = games
+        self.number_of_games = number_of_games
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_path = cache_path
+        self.seed = seed
+        self.cache = {}
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path) as file:
+                self.cache = json.load(file)
+
+    def matchup_key(self, first, second):
+        # Same key whatever the order of the players, results are cached in the order of the key
+        return ':'.join(sorted([first, second]) + [str(self.games), str(self.seed)])
+
+    def cached_result(self, first, second):
+        result = self.cache.get(self.matchup_key(first, second))
+        if result is None or first <= second:
+            return result
+        return result[::-1]
+
+    def cache_result(self, first, second, result):
+        self.cache[self.matchup_key(first, second)] = list(result) if first <= second else list(result[::-1])
+
+    def save_cache(self):
+        if self.cache_path is not None:
+            with open(self.cache_path + '.tmp', 'w') as file:
+                json.dump(self.cache, file, indent=1)
+            os.replace(self.cache_path + '.tmp', self.cache_path)
+
+    def run(self):
+        fingerprints = {player: fingerprint(player) for player in self.players}
+        count = len(self.players)
+        wins = np.zeros((count, count), dtype=np.int64)
+        pending = []
+        for first in range(count):
+            for second in range(first + 1, count):
+                result = self.cached_result(fingerprints[self.players[first]], fingerprints[self.players[second]])
+                if result is None:
+                    pending.append((first, second))
+                else:
+                    wins[first, second], wins[second, first] = result
+
+        print(f'{len(pending)} of {count * (count - 1) // 2} matchups to play')
+        if pending:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(min(self.workers, len(pending)), mp_context=context) as pool:
+                futures = {pool.submit(play_matchup, self.players[first], self.players[second], self.games,
+                                       self.number_of_games, self.seed): (first, second)
+                           for first, second in pending}
+                for future in as_completed(futures):
+                    first, second = futures[future]
+                    result = future.result()
+                    wins[first, second], wins[second, first] = result
+                    self.cache_result(fingerprints[self.players[first]], fingerprints[self.players[second]], result)
+                    # Saved after every matchup, an interrupted tournament keeps what it played
+                    self.save_cache()
+
+        games = np.full((count, count), self.games) - np.diag(np.full(count, self.games))
+        return {'players': self.players, 'wins': wins, 'win_rates': wins / np.maximum(games, 1),
+                'elo': elo_ratings(wins, games)}
+
+
+def print_results(results):
+    names = [os.path.basename(os.path.dirname(player)) or player for player in results['players']]
+    width = max(len(name) for name in names)
+    print(' ' * width + ' ' + ' '.join(f'{index:>6d}' for index in range(len(names))) + '     Elo')
+    for index in np.argsort(-results['elo']):
+        rates = ' '.join('     -' if other == index else f'{results["win_rates"][index, other]:6.3f}'
+                         for other in range(len(names)))
+        print(f'{names[index]:>{width}} {rates} {results["elo"][index]:7.1f}  ({index})')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', default='models', help='directory with one folder per trained model')
+    parser.add_argument('--games', type=int, default=1000, help='games played in every matchup')
+    parser.add_argument('--concurrent-games', type=int, default=512, help='games played together by every worker')
+    parser.add_argument('--workers', type=int, help='worker processes, one per CPU by default')
+    parser.add_argument('--cache', help='matchup results cache, models/tournament.json by default')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the win matrix and Elo ratings as JSON to this file')
+    args = parser.parse_args()
+
+    tournament = Tournament(discover_models(args.models), args.games, args.concurrent_games, args.workers,
+                            args.cache or os.path.join(args.models, 'tournament.json'), args.seed)
+    results = tournament.run()
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'players': results['players'], 'wins': results['wins'].tolist(),
+                       'win_rates': results['win_rates'].tolist(), 'elo': results['elo'].tolist()}, file, indent=2)
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import numpy as np
+
+INDEX_FILE = 'index.jsonl'
+
+
+def transition_dtype(state_size):
+    packed_size = -(-state_size // 8)
+    return np.dtype([('state', np.uint8, packed_size), ('action', np.int16), ('reward', np.float32),
+                     ('next_state', np.uint8, packed_size), ('done', bool)])
+
+
+class TrajectoryWriter:
+    """
+        Appends transitions to a directory of fixed size chunk files. Every
+        chunk is one .npy array of records with bit packed states, written
+        once it is full and only then listed in the index, so readers never
+        see a partial chunk. Writing to an existing directory continues after
+        its last chunk.
+    """
+    def __init__(self, directory, state_size, chunk_size=65536):
+        self.directory = directory
+        self.state_size = state_size
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+        self.chunks = len(TrajectoryReader.read_index(directory))
+        self.buffer = np.zeros(chunk_size, dtype=transition_dtype(state_size))
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        states = np.packbits(states, axis=-1)
+        next_states = np.packbits(next_states, axis=-1)
+        with self.lock:
+            start = 0
+            while start < len(actions):
+                end = start + min(len(actions) - start, self.chunk_size - self.count)
+                records = self.buffer[self.count:self.count + end - start]
+                records['state'] = states[start:end]
+                records['action'] = actions[start:end]
+                records['reward'] = rewards[start:end]
+                records['next_state'] = next_states[start:end]
+                records['done'] = dones[start:end]
+                self.count += end - start
+                start = end
+                if self.count == self.chunk_size:
+                    self.flush()
+
+    def flush(self):
+        if self.count == 0:
+            return
+        name = f'chunk_{self.chunks:06d}.npy'
+        path = os.path.join(self.directory, name)
+        np.save(path + '.tmp.npy', self.buffer[:self.count])
+        os.replace(path + '.tmp.npy', path)
+        with open(os.path.join(self.directory, INDEX_FILE), 'a') as file:
+            file.write(json.dumps({'chunk': name, 'transitions': self.count, 'state_size': self.state_size}) + '\n')
+        self.chunks += 1
+        self.count = 0
+
+    def close(self):
+        with self.lock:
+            self.flush()
+
+
+class TrajectoryReader:
+    """
+        Samples transitions uniformly from the chunks listed in the index of
+        a trajectory directory. Chunks are memory mapped, so only the sampled
+        records are read from disk. refresh picks up chunks written since.
+        sample returns the same arrays as ReplayMemory.sample.
+    """
+    def __init__(self, directory, seed=None):
+        self.directory = directory
+        self.rng = np.random.default_rng(seed)
+        self.chunks = []
+        self.ends = np.zeros(0, dtype=np.int64)
+        self.state_size = None
+        self.lock = threading.Lock()
+        self.refresh()
+
+    @staticmethod
+    def read_index(directory):
+        path = os.path.join(directory, INDEX_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path) as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    def refresh(self):
+        entries = self.read_index(self.directory)[len(self.chunks):]
+        with self.lock:
+            for entry in entries:
+                self.state_size = entry['state_size']
+                self.chunks.append(np.load(os.path.join(self.directory, entry['chunk']), mmap_mode='r'))
+            self.ends = np.cumsum([len(chunk) for chunk in self.chunks], dtype=np.int64)
+        return len(entries)
+
+    def __len__(self):
+        return int(self.ends[-1]) if len(self.ends) else 0
+
+    @property
+    def capacity(self):
+        return len(self)
+
+    def gather(self, indices):
+        # Every chunk is read with one fancy index
+        chunk_indices = np.searchsorted(self.ends, indices, side='right')
+        starts = np.concatenate(([0], self.ends[:-1]))
+        records = np.empty(len(indices), dtype=self.chunks[0].dtype)
+        for chunk in np.unique(chunk_indices):
+            selected = chunk_indices == chunk
+            records[selected] = self.chunks[chunk][indices[selected] - starts[chunk]]
+        return (np.unpackbits(records['state'], axis=1, count=self.state_size), records['action'],
+                records['reward'], np.unpackbits(records['next_state'], axis=1, count=self.state_size),
+                records['done'])
+
+    def sample(self, batch_size):
+        with self.lock:
+            return self.gather(self.rng.integers(len(self), size=batch_size))
+
+    def load_into(self, memory, count=None, batch_size=65536):
+        # Fills memory with count transitions sampled from the store, as many as fit by default
+        if getattr(memory, 'next_state_offset', None) is not None:
+            raise ValueError("Sampled transitions are not in game order, memory must store their next states")
+        count = min(len(self), memory.capacity) if count is None else count
+        for start in range(0, count, batch_size):
+            memory.add_batch(*self.sample(min(batch_size, count - start)))
+        return count
@@ -1,7 +1,15 @@
 from datetime import datetime
+import numpy as np
 COLORS = 4
 
 
+def spawn_seeds(seed, count):
+    # Independent child seeds of an int, None or SeedSequence seed, the first children do not depend on count
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(count)
+
+
 def get_timestamp():
     return datetime.now().strftime('%Y-%m-%d_%H-%M')
 
@@ -0,0 +1,224 @@
+import numpy as np
+from environment import UnoEnvironment
+from card import ACTION_CELL, ACTION_COLOR, ACTION_TRAIT, CARD_ACTION, DECK_SIZE, DRAW_ACTION, DRAW_4_ACTION, \
+    WILD_ACTION, SKIP, REVERSE, DRAW_2, WILD, DRAW_4
+from rules import legal_masks
+from encoder import HAND_SIZE_ENCODING, PLANE_CELLS, TOP_ENCODING
+from game_record import ENGINE_RULES, ENVIRONMENT_RULES, GameRecord
+from utils import COLORS
+
+HAND_SIZE = 7
+
+
+class VecUnoEnvironment:
+    """
+        Runs number_of_games UnoEnvironment games side by side as NumPy arrays.
+        Rules, rewards and turn order follow UnoEnvironment, finished games are
+        reset automatically and the states returned for them are the first
+        states of the new games.
+    """
+    DRAW_CARD_REWARD = UnoEnvironment.DRAW_CARD_REWARD
+    CARD_PLAYED_REWARD = UnoEnvironment.CARD_PLAYED_REWARD
+    WIN_REWARD = UnoEnvironment.WIN_REWARD
+    ACTION_COUNT = UnoEnvironment.ACTION_COUNT
+    STATE_SIZE = UnoEnvironment.STATE_SIZE
+    RULES = ENVIRONMENT_RULES
+    first_player = 0
+
+    def __init__(self, number_of_games, number_of_players=2, seed=None, recorder=None):
+        self.number_of_games = number_of_games
+        self.number_of_players = number_of_players
+        self.rng = np.random.default_rng(seed)
+        self.games = np.arange(number_of_games)
+        self.hands = np.zeros((number_of_games, number_of_players, 54), dtype=np.int8)
+        # Draw pile is decks[game, deck_pos:deck_end], discard pile is discard[game, :discard_len]
+        self.decks = np.zeros((number_of_games, DECK_SIZE), dtype=np.int8)
+        self.deck_pos = np.zeros(number_of_games, dtype=np.int64)
+        self.deck_end = np.zeros(number_of_games, dtype=np.int64)
+        self.discard = np.zeros((number_of_games, DECK_SIZE), dtype=np.int8)
+        self.discard_len = np.zeros(number_of_games, dtype=np.int64)
+        self.top = np.zeros(number_of_games, dtype=np.int8)
+        self.top_color = np.zeros(number_of_games, dtype=np.int8)
+        self.turn_direction = np.ones(number_of_games, dtype=np.int64)
+        self.current_player = np.zeros(number_of_games, dtype=np.int64)
+        self.turn = np.zeros(number_of_games, dtype=np.int64)
+        # Deal, actions, top colors and reshuffled decks of every game so far, written to recorder once it ends
+        # if recorded is set for its slot
+        self.recorder = recorder
+        self.recorded = np.ones(number_of_games, dtype=bool)
+        self.record_deals = np.zeros((number_of_games, DECK_SIZE), dtype=np.int8)
+        self.record_actions = np.zeros((number_of_games, 256), dtype=np.uint8)
+        self.record_colors = np.zeros((number_of_games, 256), dtype=np.uint8)
+        self.record_reshuffles = [[] for _ in range(number_of_games)]
+        self.reset()
+
+    def reset(self):
+        self.reset_games(self.games)
+        return self.get_states(), self.get_legal_masks()
+
+    def reset_games(self, games):
+        count = len(games)
+        if count == 0:
+            return
+        dealt = HAND_SIZE * self.number_of_players
+        decks = CARD_ACTION[self.rng.random((count, DECK_SIZE)).argsort(axis=1)]
+        self.decks[games] = decks
+
+        self.hands[games] = 0
+        seats = np.repeat(np.arange(self.number_of_players), HAND_SIZE)
+        np.add.at(self.hands, (games[:, None], seats[None, :], decks[:, :dealt]), 1)
+
+        # Reveal cards until a number card is on top, the others stay in the discard pile
+        revealed = decks[:, dealt:]
+        first_number = np.argmax(ACTION_TRAIT[revealed] < SKIP, axis=1)
+        self.discard[games, :DECK_SIZE - dealt] = revealed
+        self.discard_len[games] = first_number + 1
+        self.top[games] = revealed[np.arange(count), first_number]
+        self.top_color[games] = ACTION_COLOR[self.top[games]]
+        self.deck_pos[games] = dealt + first_number + 1
+        self.deck_end[games] = DECK_SIZE
+
+        self.turn_direction[games] = 1
+        self.current_player[games] = 0
+        self.turn[games] = 0
+        if self.recorder is not None:
+            self.record_deals[games] = decks
+            for game in games:
+                self.record_reshuffles[game] = []
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.number_of_games)
+        games = self.games
+        current = self.current_player
+        self.turn += 1
+
+        draw = actions == DRAW_ACTION
+        played_games = np.flatnonzero(~draw)
+        played = actions[played_games]
+        if np.any(self.hands[played_games, current[played_games], played] <= 0):
+            raise ValueError("Played card is not in the hand of the current player")
+
+        self.hands[played_games, current[played_games], played] -= 1
+        self.discard[played_games, self.discard_len[played_games]] = played
+        self.discard_len[played_games] += 1
+        self.top[played_games] = played
+
+        traits = ACTION_TRAIT[played]
+        wild = traits >= WILD
+        colors = ACTION_COLOR[played]
+        colors[wild] = self.rng.integers(COLORS, size=np.count_nonzero(wild))
+        self.top_color[played_games] = colors
+
+        reversed_games = played_games[traits == REVERSE]
+        self.turn_direction[reversed_games] *= -1
+
+        skip = np.zeros(self.number_of_games, dtype=bool)
+        skip[played_games[(traits == SKIP) | (traits == DRAW_2) | (traits == DRAW_4)]] = True
+        if self.number_of_players == 2:
+            skip[reversed_games] = True
+
+        # Current player draws one card, draw_2 and draw_4 make the next player draw
+        opponent = (current + self.turn_direction) % self.number_of_players
+        draw_counts = draw.astype(np.int64)
+        draw_counts[played_games[traits == DRAW_2]] = 2
+        draw_counts[played_games[traits == DRAW_4]] = 4
+        draw_seats = np.where(draw, current, opponent)
+        self.draw_cards(draw_counts, draw_seats)
+
+        rewards = np.where(draw, self.DRAW_CARD_REWARD, self.CARD_PLAYED_REWARD).astype(np.float32)
+        dones = self.hands[games, current].sum(axis=1) == 0
+        if self.number_of_players == 1:
+            dones[:] = True
+        rewards[dones] += self.WIN_REWARD
+
+        if self.recorder is not None:
+            self.record_step(actions, dones, current)
+        self.advance_turn(skip)
+        self.reset_games(np.flatnonzero(dones))
+        return self.get_states(), rewards, dones, self.get_legal_masks()
+
+    def record_step(self, actions, dones, current):
+        # The turn counter is the number of recorded actions, it is reset with the game
+        turns = self.turn - 1
+        if turns.max() >= self.record_actions.shape[1]:
+            width = 2 * self.record_actions.shape[1]
+            self.record_actions = np.pad(self.record_actions, ((0, 0), (0, width - self.record_actions.shape[1])))
+            self.record_colors = np.pad(self.record_colors, ((0, 0), (0, width - self.record_colors.shape[1])))
+        self.record_actions[self.games, turns] = actions
+        self.record_colors[self.games, turns] = self.top_color
+
+        for game in np.flatnonzero(dones & self.recorded):
+            actions = self.record_actions[game, :self.turn[game]]
+            colors = self.record_colors[game, :self.turn[game]]
+            wild = (actions == WILD_ACTION) | (actions == DRAW_4_ACTION)
+            self.recorder.write(GameRecord(self.RULES, self.number_of_players, self.first_player, current[game],
+                                           self.record_deals[game], actions, colors[wild],
+                                           self.record_reshuffles[game]))
+
+    def advance_turn(self, skip):
+        # As in UnoEnvironment.step, only skipping cards pass the turn on
+        self.current_player[skip] = (self.current_player[skip] + self.turn_direction[skip]) \
+                                    % self.number_of_players
+
+    def draw_cards(self, draw_counts, draw_seats):
+        # Handle empty deck
+        for game in np.flatnonzero(draw_counts > self.deck_end - self.deck_pos):
+            self.shuffle_played_cards_into_deck(game)
+
+        for drawn in range(draw_counts.max(initial=0)):
+            games = np.flatnonzero((draw_counts > drawn) & (self.deck_pos < self.deck_end))
+            cards = self.decks[games, self.deck_pos[games]]
+            self.hands[games, draw_seats[games], cards] += 1
+            self.deck_pos[games] += 1
+
+    def shuffle_played_cards_into_deck(self, game):
+        remaining = self.decks[game, self.deck_pos[game]:self.deck_end[game]]
+        played = self.discard[game, :self.discard_len[game] - 1]
+        cards = np.concatenate((remaining, played))
+        self.rng.shuffle(cards)
+        if self.recorder is not None:
+            self.record_reshuffles[game].append(cards)
+        self.decks[game, :len(cards)] = cards
+        self.deck_pos[game] = 0
+        self.deck_end[game] = len(cards)
+        self.discard[game, 0] = self.discard[game, self.discard_len[game] - 1]
+        self.discard_len[game] = 1
+
+    def get_states(self):
+        games = self.games
+        hands = self.hands[games, self.current_player]
+        states = np.zeros((self.number_of_games, 6, PLANE_CELLS), dtype=np.uint8)
+
+        # Planes 0 - 3 mark how many copies of each card are in the hand
+        rows, cards = np.nonzero(hands)
+        states[rows, hands[rows, cards] - 1, ACTION_CELL[cards]] = 1
+
+        states[:, 4] = TOP_ENCODING[self.top_color, self.top]
+
+        # Plane 5 encodes the opponents hand size
+        opponent = (self.current_player + self.turn_direction) % self.number_of_players
+        opponent_hand_size = self.hands[games, opponent].sum(axis=1)
+        states[:, 5] = HAND_SIZE_ENCODING[np.minimum(opponent_hand_size, PLANE_CELLS)]
+        return states.reshape(self.number_of_games, self.STATE_SIZE)
+
+    def get_legal_masks(self):
+        return legal_masks(self.hands[self.games, self.current_player], self.top, self.top_color)
+
+
+class VecUnoGame(VecUnoEnvironment):
+    """
+        VecUnoEnvironment with the turn order of UnoGame and UnoTest, the turn
+        passes after every move and skipping cards skip the next player.
+    """
+    RULES = ENGINE_RULES
+
+    def __init__(self, number_of_games, number_of_players=2, seed=None, first_player=0, recorder=None):
+        self.first_player = first_player
+        super().__init__(number_of_games, number_of_players, seed, recorder)
+
+    def reset_games(self, games):
+        super().reset_games(games)
+        self.current_player[games] = self.first_player
+
+    def advance_turn(self, skip):
+        self.current_player = (self.current_player + self.turn_direction * (1 + skip)) % self.number_of_players